@@ -0,0 +1,164 @@
+"""
+Benchmarks of the CAMELS parsers on synthetic CAMELS files.
+
+For every file size the latency of `is_mainfile`, the wall time and peak Python
+memory of `parse` and the cost of `create_archive` are measured. The results are
+written as JSON, so that runs of different commits can be compared:
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --sizes large --repeat 5
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from nomad.datamodel import EntryArchive
+from nomad.datamodel.datamodel import EntryMetadata
+from synthetic import FileSize, write_camels_file
+
+from nomad_camels_plugin.parsers.bulk import LocalUploadContext, match_file
+from nomad_camels_plugin.parsers.hdf5_session import release_all
+from nomad_camels_plugin.parsers.matching import _classify
+from nomad_camels_plugin.parsers.parser import CamelsParser, CamelsParserDiode
+from nomad_camels_plugin.parsers.utils import create_archive
+
+SIZES = {
+    'small': [
+        FileSize(),
+        FileSize(instruments=10, settings_depth=4, tags=10),
+        FileSize(plots=5, points=1000),
+        FileSize(plots=4, points=500, diode=True),
+    ],
+    'large': [
+        FileSize(instruments=50, settings_depth=8, tags=50),
+        FileSize(plots=20, points=100_000),
+        FileSize(plots=1, points=1_000_000),
+        FileSize(plots=20, points=10_000, diode=True),
+    ],
+}
+
+
+def _median_seconds(function, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_file(path: str, size: FileSize, repeat: int) -> dict:
+    parsers = (CamelsParserDiode(), CamelsParser())
+    # The parser warns about the missing NOMAD sample and user of every file
+    logger = logging.getLogger('camels.benchmarks')
+    logger.setLevel(logging.ERROR)
+    raw_dir = os.path.dirname(path)
+
+    def match_cold():
+        # Forget the cached classification and the open handle of the file
+        _classify.cache_clear()
+        release_all()
+        return match_file(path, parsers)
+
+    parser = match_cold()
+    expected = CamelsParserDiode if size.diode else CamelsParser
+    assert type(parser) is expected, f'{path} was matched by {parser}'
+    result = {
+        'file': size.label,
+        'size': size._asdict(),
+        'file_bytes': os.path.getsize(path),
+        'is_mainfile_cold_seconds': _median_seconds(match_cold, repeat),
+        'is_mainfile_warm_seconds': _median_seconds(
+            lambda: match_file(path, parsers), repeat
+        ),
+    }
+
+    def parse():
+        release_all()
+        return parser.parse(path, EntryArchive(), logger, testing=True)
+
+    # The first parse imports the parsing modules
+    data = parse()
+    result['parse_seconds'] = _median_seconds(parse, repeat)
+    tracemalloc.start()
+    parse()
+    result['parse_peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    context = LocalUploadContext(raw_dir)
+    filename = f'{os.path.basename(path)}.archive.json'
+
+    archive = EntryArchive(data=data, metadata=EntryMetadata())
+    result['create_archive_seconds'] = _median_seconds(
+        lambda: create_archive(
+            archive, context, filename, 'json', logger, overwrite=True
+        ),
+        repeat,
+    )
+    result['archive_bytes'] = os.path.getsize(os.path.join(raw_dir, filename))
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', choices=sorted(SIZES), default='small')
+    parser.add_argument(
+        '--repeat', type=int, default=3, help='Repetitions of every measurement.'
+    )
+    parser.add_argument('--output', help='The JSON file, defaults to stdout.')
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        raw_dir = os.path.join(directory, 'raw')
+        os.makedirs(raw_dir)
+        for index, size in enumerate(SIZES[args.sizes]):
+            path = os.path.join(raw_dir, f'{size.label}.nxs')
+            write_camels_file(path, size, seed=index)
+            results.append(benchmark_file(path, size, args.repeat))
+            print(
+                f'{size.label}: {results[-1]["parse_seconds"]:.3f} s', file=sys.stderr
+            )
+
+    report = {
+        'commit': _git_commit(),
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sizes': args.sizes,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
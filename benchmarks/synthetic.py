@@ -0,0 +1,131 @@
+"""
+Generator of synthetic CAMELS files for the benchmarks.
+
+The files have the layout that CAMELS writes with suitcase >= 1.0: the
+measurement details, a sample, a user, instruments with nested settings and one
+stream with a `plot_*` group per plot. Diode demo files contain I-V curves.
+"""
+
+import json
+from typing import NamedTuple
+
+import h5py
+import numpy as np
+
+SUITCASE_VERSION = b'1.2.0'
+
+
+class FileSize(NamedTuple):
+    """
+    The size parameters of a synthetic CAMELS file.
+
+    Attributes:
+        instruments: Number of instruments.
+        settings_depth: Nesting depth of the settings of every instrument.
+        tags: Number of measurement tags.
+        plots: Number of plots, every plot has its own stream.
+        points: Number of points of every trace.
+        diode: Write a diode demo measurement with I-V curves.
+    """
+
+    instruments: int = 2
+    settings_depth: int = 2
+    tags: int = 2
+    plots: int = 1
+    points: int = 100
+    diode: bool = False
+
+    @property
+    def label(self) -> str:
+        kind = 'diode' if self.diode else 'generic'
+        return (
+            f'{kind}-i{self.instruments}-d{self.settings_depth}-t{self.tags}'
+            f'-p{self.plots}-n{self.points}'
+        )
+
+
+def _write_settings(group: h5py.Group, depth: int) -> None:
+    group['voltage'] = 2.5
+    group['mode'] = b'sweep'
+    group['points'] = b'11'
+    group['channels'] = np.array([b'1', b'2.5', b'off'])
+    group['offsets'] = np.linspace(0, 1, 8)
+    if depth > 1:
+        _write_settings(group.create_group('nested'), depth - 1)
+
+
+def diode_current(voltage: np.ndarray, serial_resistance: float = 10.0):
+    """
+    The current through a diode with a series resistor at `voltage`, a Shockley
+    diode below and a straight line above its threshold.
+    """
+    threshold = 0.7
+    return np.where(
+        voltage > threshold,
+        (voltage - threshold) / serial_resistance,
+        1e-12 * (np.exp(voltage / 0.05) - 1),
+    )
+
+
+def write_camels_file(path: str, size: FileSize = FileSize(), seed: int = 0) -> None:
+    """
+    Writes a synthetic CAMELS file of the given `size` to `path`.
+    """
+    rng = np.random.default_rng(seed)
+    tags = [f'Tag {index}'.encode() for index in range(size.tags)]
+    if size.diode:
+        tags += [b'diode', b'demo']
+    with h5py.File(path, 'w') as f:
+        f.attrs['NX_class'] = 'NXroot'
+        f.attrs['file_type'] = 'NOMAD CAMELS'
+        entry = f.create_group('CAMELS_Benchmark Session')
+        entry.attrs['NX_class'] = 'NXentry'
+
+        details = entry.create_group('measurement_details')
+        details['start_time'] = b'2025-03-04T17:14:44.175182+00:00'
+        details['end_time'] = b'2025-03-04T17:14:55.439912+00:00'
+        details['protocol_description'] = b'Synthetic protocol.\nNew Line.'
+        details['measurement_description'] = b'Synthetic measurement'
+        details['measurement_tags'] = tags
+        details['measurement_comments'] = b''
+        details['protocol_overview'] = b'Sweep of every stream'
+        details['plan_name'] = b'Benchmark_plan'
+        details['protocol_json'] = json.dumps(
+            {'plots': [], 'loop_step_dict': {}}
+        ).encode()
+        details['session_name'] = b'Benchmark Session'
+        details['python_script'] = b'print("benchmark")\n' * 100
+
+        entry['sample/name'] = b'benchmark_sample'
+        entry['user/name'] = b'benchmark_user'
+        entry['program/python_environment/suitcase-nomad-camels-hdf5'] = (
+            SUITCASE_VERSION
+        )
+
+        instruments = entry.create_group('instruments')
+        for index in range(size.instruments):
+            instrument = instruments.create_group(f'instrument_{index}')
+            instrument.attrs['NX_class'] = 'NXinstrument'
+            _write_settings(instrument.create_group('settings'), size.settings_depth)
+
+        data = entry.create_group('data')
+        data.attrs['NX_class'] = 'NXdata'
+        for index in range(size.plots):
+            stream = data.create_group(f'stream_{index}')
+            stream.attrs['NX_class'] = 'NXdata'
+            if size.diode:
+                x = np.linspace(0, 2, size.points)
+                y = diode_current(x) + rng.normal(0, 1e-4, size.points)
+                x_name, y_name = 'voltage', 'current'
+            else:
+                x = np.linspace(-1, 1, size.points)
+                y = np.exp(-(x**2) / 0.1) + rng.normal(0, 0.01, size.points)
+                x_name, y_name = 'motor', 'detector'
+            stream[x_name] = x
+            stream[y_name] = y
+            plot = stream.create_group(f'plot_{index}')
+            plot.attrs['NX_class'] = 'NXdata'
+            plot['_plot_data_axes'] = x
+            plot['_plot_data_axes'].attrs['long_name'] = x_name
+            plot['_plot_data_signal'] = y
+            plot['_plot_data_signal'].attrs.update(long_name=y_name, y_axes_index=1)
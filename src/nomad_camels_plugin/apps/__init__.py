@@ -82,6 +82,36 @@ camels_app = AppEntryPoint(
                     type='terms',
                     search_quantity=f'data.instruments.name#{schema}',
                 ),
+                MenuItemTerms(
+                    title='Recorded channel',
+                    type='terms',
+                    search_quantity=f'data.channels.name#{schema}',
+                ),
+                Menu(
+                    title='Channel statistics',
+                    items=[
+                        MenuItemTerms(
+                            title='Channel',
+                            type='terms',
+                            search_quantity=f'data.channel_statistics.name#{schema}',
+                        ),
+                        MenuItemHistogram(
+                            title='Minimum',
+                            type='histogram',
+                            x=f'data.channel_statistics.minimum#{schema}',
+                        ),
+                        MenuItemHistogram(
+                            title='Maximum',
+                            type='histogram',
+                            x=f'data.channel_statistics.maximum#{schema}',
+                        ),
+                        MenuItemHistogram(
+                            title='Mean',
+                            type='histogram',
+                            x=f'data.channel_statistics.mean#{schema}',
+                        ),
+                    ],
+                ),
                 MenuItemCustomQuantities(),
             ],
         ),
@@ -1,11 +1,79 @@
+from typing import Literal, Optional
+
 from nomad.config.models.plugins import ParserEntryPoint
+from pydantic import Field
+
+
+class CamelsParserEntryPoint(ParserEntryPoint):
+    figure_mode: Literal['inline', 'reference'] = Field(
+        'inline',
+        description="""
+        How the plots of the CAMELS file are stored in the archive. 'inline' stores
+        Plotly figures including all plotted values, 'reference' only stores the
+        layout and trace metadata and references the values in the CAMELS file.
+        """,
+    )
+    max_trace_points: int = Field(
+        10000,
+        description="""
+        Point budget of every trace of the inlined Plotly figures. Longer traces are
+        downsampled for display and link their full resolution data in the CAMELS
+        file. 0 disables downsampling.
+        """,
+    )
+    downsampling: Literal['lttb', 'minmax'] = Field(
+        'lttb',
+        description="""
+        The downsampling algorithm. 'lttb' keeps the visually most important points,
+        'minmax' keeps the minimum and maximum of every bucket.
+        """,
+    )
+    memory_limit_mb: int = Field(
+        0,
+        description="""
+        Memory ceiling of parsing one file in MiB. With a limit, plotted datasets
+        are read in chunk-aligned blocks and only their downsampled previews and
+        statistics are kept, large settings are stored as summaries and a warning
+        is logged if the peak memory exceeds the limit. 0 reads every dataset at
+        once.
+        """,
+    )
+    incremental: bool = Field(
+        False,
+        description="""
+        Skip files that did not change since their archive was written. The size,
+        modification time and content hash of every file are stored with its
+        archive, together with the plugin version and the parser options.
+        """,
+    )
+    profiler: Optional[Literal['cprofile', 'pyinstrument']] = Field(
+        None,
+        description="""
+        Writes a profile of every parsed entry, with cProfile as .prof file or with
+        pyinstrument as .html file. pyinstrument has to be installed.
+        """,
+    )
+    profile_dir: Optional[str] = Field(
+        None,
+        description="""
+        The directory the profiles are written to, defaults to camels_profiles in
+        the working directory.
+        """,
+    )
 
-class CamelsParserDiodeEntryPoint(ParserEntryPoint):
+    def load(self):
+        from nomad_camels_plugin.parsers.parser import CamelsParser
+
+        return CamelsParser(**self.dict())
+
+
+class CamelsParserDiodeEntryPoint(CamelsParserEntryPoint):
     def load(self):
         from nomad_camels_plugin.parsers.parser import CamelsParserDiode
 
         return CamelsParserDiode(**self.dict())
 
+
 camelsDiode_parser = CamelsParserDiodeEntryPoint(
     name='CamelsParserDiode',
     description='New parser entry point configuration.',
@@ -13,12 +81,6 @@ camelsDiode_parser = CamelsParserDiodeEntryPoint(
     mainfile_mime_re='(application/x-hdf)',
 )
 
-class CamelsParserEntryPoint(ParserEntryPoint):
-    def load(self):
-        from nomad_camels_plugin.parsers.parser import CamelsParser
-
-        return CamelsParser(**self.dict())
-
 
 camels_parser = CamelsParserEntryPoint(
     name='CamelsParser',
@@ -0,0 +1,371 @@
+"""
+Bulk parsing of CAMELS files outside of NOMAD.
+
+Historic CAMELS files are back-filled by parsing them in a process pool. Every
+file is matched with the `is_mainfile` logic of the CAMELS parsers and the
+companion `.archive.json` file is written into the raw directory of the upload,
+exactly as it is when NOMAD processes the file. The archives can then be
+imported offline.
+
+Run `camels-bulk-parse --help` for the command line options.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections.abc import Callable, Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import NamedTuple, Optional
+
+from .hdf5_session import release_all
+
+
+class LocalUploadContext:
+    """
+    The part of a NOMAD upload context that `create_archive` uses, backed by a
+    local raw directory.
+
+    Args:
+        raw_dir (str): The raw directory of the upload.
+        upload_id (str, optional): The id of the upload the archives are imported
+            into.
+    """
+
+    def __init__(self, raw_dir: str, upload_id: Optional[str] = None):
+        self.raw_dir = os.path.abspath(raw_dir)
+        self.upload_id = upload_id
+
+    @property
+    def upload(self) -> 'LocalUploadContext':
+        return self
+
+    def raw_path_exists(self, path: str) -> bool:
+        return os.path.exists(os.path.join(self.raw_dir, path))
+
+    def raw_file(self, path: str, *args, **kwargs):
+        return open(os.path.join(self.raw_dir, path), *args, **kwargs)
+
+    def process_updated_raw_file(self, path: str, allow_modify: bool = False):
+        # The written archives are imported later, nothing to process now
+        pass
+
+
+class ParseResult(NamedTuple):
+    """
+    The outcome of one file of a bulk run.
+
+    Attributes:
+        path: The path of the file.
+        parser: Name of the parser that matched the file, `None` if no CAMELS
+            parser matched.
+        error: Why parsing failed, `None` on success.
+        seconds: The time spent on matching and parsing the file.
+    """
+
+    path: str
+    parser: Optional[str]
+    error: Optional[str]
+    seconds: float
+
+
+class _ErrorCollector(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+# The parsers of a worker process, set by _init_worker
+_parsers = ()
+
+
+def load_parsers(parser_options: Optional[dict] = None) -> tuple:
+    """
+    Loads the CAMELS parsers from their entry points, like NOMAD does.
+
+    Args:
+        parser_options (dict, optional): Values for the fields of the parser entry
+            points, e.g. `figure_mode`.
+
+    Returns:
+        tuple: The parsers, in the order they are matched.
+    """
+    from . import camels_parser, camelsDiode_parser
+
+    return tuple(
+        entry_point.model_copy(update=parser_options or {}).load()
+        for entry_point in (camelsDiode_parser, camels_parser)
+    )
+
+
+def _init_worker(parser_options: Optional[dict]) -> None:
+    global _parsers
+    _parsers = load_parsers(parser_options)
+
+
+def match_file(path: str, parsers: Sequence):
+    """
+    Returns the parser that matches the file at `path` or `None`. The file is
+    inspected like NOMAD does it when it matches the files of an upload.
+    """
+    import magic
+    from nomad import config
+
+    if os.path.basename(path).startswith(('.', '~')):
+        return None
+    with open(path, 'rb') as f:
+        buffer = f.read(config.process.parser_matching_size)
+    mime_type = magic.from_buffer(buffer, mime=True)
+    try:
+        decoded_buffer = buffer.decode('utf-8')
+    except UnicodeDecodeError:
+        decoded_buffer = None
+    for parser in parsers:
+        if parser.is_mainfile(path, mime_type, buffer, decoded_buffer):
+            return parser
+    return None
+
+
+def parse_file(path: str, raw_dir: str, upload_id: Optional[str] = None) -> ParseResult:
+    """
+    Matches the file at `path` and parses it with the parsers of the process.
+    The companion archive is written into `raw_dir`.
+
+    Returns:
+        ParseResult: The outcome, errors are reported and not raised.
+    """
+    from nomad.datamodel import EntryArchive
+    from nomad.datamodel.datamodel import EntryMetadata
+
+    start = time.perf_counter()
+    parser_name = None
+    errors = _ErrorCollector()
+    logger = logging.getLogger(f'{__name__}.{os.getpid()}')
+    logger.addHandler(errors)
+    try:
+        parser = match_file(path, _parsers)
+        if parser is not None:
+            parser_name = parser.name
+            context = LocalUploadContext(raw_dir, upload_id)
+            archive = EntryArchive(
+                m_context=context,
+                metadata=EntryMetadata(
+                    mainfile=os.path.relpath(os.path.abspath(path), context.raw_dir),
+                    upload_id=upload_id,
+                ),
+            )
+            parser.parse(os.path.abspath(path), archive, logger)
+    except Exception as e:
+        errors.messages.append(f'{type(e).__name__}: {e}')
+    finally:
+        logger.removeHandler(errors)
+        # Workers parse thousands of files, no handle may stay open
+        release_all()
+    return ParseResult(
+        path,
+        parser_name,
+        '; '.join(errors.messages) or None,
+        time.perf_counter() - start,
+    )
+
+
+def parse_files(
+    paths: Sequence[str], raw_dir: str, upload_id: Optional[str] = None
+) -> list[ParseResult]:
+    """
+    Parses the files one after the other, see `parse_file`.
+    """
+    return [parse_file(path, raw_dir, upload_id) for path in paths]
+
+
+def group_by_archive(paths: Iterable[str]) -> list[list[str]]:
+    """
+    Groups the files by the companion archive they write. The archives are named
+    after the file in the raw directory, so files with the same name in different
+    directories write the same archive.
+    """
+    groups = {}
+    for path in paths:
+        groups.setdefault(os.path.basename(path), []).append(path)
+    return list(groups.values())
+
+
+def find_files(paths: Iterable[str]) -> list[str]:
+    """
+    Expands the directories in `paths` into the files they contain. Hidden files
+    and directories are skipped.
+    """
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for directory, directories, names in os.walk(path):
+            directories[:] = sorted(
+                name for name in directories if not name.startswith('.')
+            )
+            files.extend(
+                os.path.join(directory, name)
+                for name in sorted(names)
+                if not name.startswith('.')
+            )
+    return files
+
+
+def bulk_parse(
+    paths: Sequence[str],
+    raw_dir: str,
+    upload_id: Optional[str] = None,
+    workers: Optional[int] = None,
+    parser_options: Optional[dict] = None,
+    progress: Optional[Callable[[int, int, ParseResult], None]] = None,
+) -> list[ParseResult]:
+    """
+    Matches and parses many files and writes their companion archives.
+
+    The files are parsed in a pool of spawned processes. Files that write the
+    same archive are parsed one after the other by the same process, in the order
+    of `paths`. With one worker all files are parsed one after the other in this
+    process, the archives are the same.
+
+    Args:
+        paths (Sequence[str]): The files to parse, all inside `raw_dir`.
+        raw_dir (str): The raw directory of the upload.
+        upload_id (str, optional): The id of the upload the archives are imported
+            into.
+        workers (int, optional): Number of processes, defaults to the CPU count.
+        parser_options (dict, optional): Values for the fields of the parser entry
+            points.
+        progress (Callable, optional): Called with the number of finished files,
+            the number of files and the result of every finished file.
+
+    Returns:
+        list[ParseResult]: The results in the order of `paths`.
+    """
+    workers = workers or os.cpu_count() or 1
+    results = {}
+
+    def finished(result):
+        results[result.path] = result
+        if progress is not None:
+            progress(len(results), len(paths), result)
+
+    if workers == 1:
+        _init_worker(parser_options)
+        for path in paths:
+            finished(parse_file(path, raw_dir, upload_id))
+    else:
+        groups = group_by_archive(paths)
+        # Spawned workers do not inherit open HDF5 handles of this process
+        with ProcessPoolExecutor(
+            max_workers=min(workers, max(len(groups), 1)),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(parser_options,),
+        ) as executor:
+            futures = [
+                executor.submit(parse_files, group, raw_dir, upload_id)
+                for group in groups
+            ]
+            for future in as_completed(futures):
+                for result in future.result():
+                    finished(result)
+    return [results[path] for path in paths]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='camels-bulk-parse',
+        description='Parse CAMELS files in parallel and write their archives.',
+    )
+    parser.add_argument(
+        'raw_dir',
+        help='The raw directory of the upload, the archives are written into it.',
+    )
+    parser.add_argument(
+        'paths',
+        nargs='*',
+        help='Files or directories inside raw_dir, defaults to all of raw_dir.',
+    )
+    parser.add_argument(
+        '--file-list',
+        help='A file with one path per line, relative to raw_dir or absolute.',
+    )
+    parser.add_argument('--upload-id', help='The id of the target upload.')
+    parser.add_argument(
+        '--workers', type=int, default=None, help='Number of worker processes.'
+    )
+    parser.add_argument(
+        '--figure-mode', choices=('inline', 'reference'), default='inline'
+    )
+    parser.add_argument('--max-trace-points', type=int, default=10000)
+    parser.add_argument('--downsampling', choices=('lttb', 'minmax'), default='lttb')
+    parser.add_argument(
+        '--memory-limit-mb',
+        type=int,
+        default=0,
+        help='Memory ceiling of every worker while it parses a file, 0 is unbounded.',
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Skip files that did not change since their archive was written.',
+    )
+    parser.add_argument(
+        '--profiler',
+        choices=('cprofile', 'pyinstrument'),
+        help='Write a profile of every parsed entry.',
+    )
+    parser.add_argument('--profile-dir', help='The directory of the profiles.')
+    args = parser.parse_args(argv)
+
+    paths = [os.path.join(args.raw_dir, path) for path in args.paths]
+    if args.file_list:
+        with open(args.file_list) as f:
+            paths.extend(
+                os.path.join(args.raw_dir, line.strip()) for line in f if line.strip()
+            )
+    files = find_files(paths or [args.raw_dir])
+    options = {
+        'figure_mode': args.figure_mode,
+        'max_trace_points': args.max_trace_points,
+        'downsampling': args.downsampling,
+        'memory_limit_mb': args.memory_limit_mb,
+        'incremental': args.incremental,
+        'profiler': args.profiler,
+        'profile_dir': args.profile_dir,
+    }
+
+    def report(done, total, result):
+        status = 'skipped' if result.parser is None else 'parsed'
+        if result.error is not None:
+            status = f'failed: {result.error}'
+        print(
+            f'[{done}/{total}] {result.path} ({result.seconds:.2f} s) {status}',
+            file=sys.stderr,
+        )
+
+    start = time.perf_counter()
+    results = bulk_parse(
+        files, args.raw_dir, args.upload_id, args.workers, options, report
+    )
+    seconds = time.perf_counter() - start
+    failed = [result for result in results if result.error is not None]
+    parsed = [result for result in results if result.parser and result.error is None]
+    print(
+        f'{len(parsed)} parsed, {len(results) - len(parsed) - len(failed)} skipped, '
+        f'{len(failed)} failed in {seconds:.1f} s '
+        f'({len(results) / seconds if seconds else 0:.1f} files/s)'
+    )
+    for result in failed:
+        print(f'FAILED {result.path}: {result.error}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
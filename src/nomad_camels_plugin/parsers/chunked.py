@@ -0,0 +1,152 @@
+"""
+Chunked reading of large datasets for the memory-bounded parse mode.
+
+Datasets are read in blocks of whole storage chunks whose size is derived from
+the memory limit of the parse, so every chunk is read and decompressed once and
+no dataset is held in memory as a whole.
+"""
+
+import math
+from collections.abc import Iterator
+from typing import Optional
+
+import h5py
+import numpy as np
+
+MIN_BLOCK_BYTES = 2**20
+# A block is read for x and y and a few temporaries of its size are created
+BLOCKS_PER_MEMORY_LIMIT = 16
+
+
+def block_bytes(memory_limit: int) -> int:
+    """
+    The size of the blocks read at once when the parse may use `memory_limit`
+    bytes.
+    """
+    return max(memory_limit // BLOCKS_PER_MEMORY_LIMIT, MIN_BLOCK_BYTES)
+
+
+def block_rows(dataset: h5py.Dataset, max_bytes: int) -> int:
+    """
+    The number of rows of `dataset` that are read at once, a multiple of the rows
+    of its storage chunks if it is chunked.
+    """
+    row_bytes = max(dataset.dtype.itemsize * math.prod(dataset.shape[1:]), 1)
+    rows = max(max_bytes // row_bytes, 1)
+    if dataset.chunks is not None:
+        chunk_rows = dataset.chunks[0]
+        rows = max(rows // chunk_rows, 1) * chunk_rows
+    return rows
+
+
+def iter_blocks(
+    dataset: h5py.Dataset, max_bytes: int
+) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Yields the start row and the values of consecutive blocks of `dataset`.
+    """
+    if dataset.ndim == 0:
+        yield 0, dataset[()]
+        return
+    rows = block_rows(dataset, max_bytes)
+    for start in range(0, dataset.shape[0], rows):
+        yield start, dataset[start : start + rows]
+
+
+class RunningStatistics:
+    """
+    Summary statistics of values that are added block by block. The mean and the
+    variance are merged with the parallel algorithm of Chan et al.
+
+    Attributes:
+        count: Number of values that are not NaN.
+        nan_count: Number of NaN values.
+        minimum: Smallest value, `None` without values.
+        maximum: Largest value, `None` without values.
+        mean: Mean of the values, `None` without values.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.nan_count = 0
+        self.minimum: Optional[float] = None
+        self.maximum: Optional[float] = None
+        self.mean: Optional[float] = None
+        self._squared_deviations = 0.0
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64).ravel()
+        is_nan = np.isnan(values)
+        n_nan = int(is_nan.sum())
+        self.nan_count += n_nan
+        if n_nan:
+            values = values[~is_nan]
+        if not len(values):
+            return
+        block_mean = float(values.mean())
+        block_squared_deviations = float(((values - block_mean) ** 2).sum())
+        block_min, block_max = float(values.min()), float(values.max())
+        if self.count == 0:
+            self.mean = block_mean
+            self._squared_deviations = block_squared_deviations
+            self.minimum, self.maximum = block_min, block_max
+        else:
+            total = self.count + len(values)
+            delta = block_mean - self.mean
+            self.mean += delta * len(values) / total
+            self._squared_deviations += (
+                block_squared_deviations + delta**2 * self.count * len(values) / total
+            )
+            self.minimum = min(self.minimum, block_min)
+            self.maximum = max(self.maximum, block_max)
+        self.count += len(values)
+
+    @property
+    def std(self) -> Optional[float]:
+        """
+        The population standard deviation, `None` without values.
+        """
+        if self.count == 0:
+            return None
+        return math.sqrt(self._squared_deviations / self.count)
+
+    def as_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'nan_count': self.nan_count,
+            'min': self.minimum,
+            'max': self.maximum,
+            'mean': self.mean,
+            'std': self.std,
+        }
+
+
+def dataset_statistics(dataset: h5py.Dataset, max_bytes: int) -> RunningStatistics:
+    """
+    The statistics of a numeric dataset, read block by block.
+    """
+    statistics = RunningStatistics()
+    for _, block in iter_blocks(dataset, max_bytes):
+        statistics.update(block)
+    return statistics
+
+
+def dataset_summary(dataset: h5py.Dataset, max_bytes: int) -> dict:
+    """
+    A JSON serializable summary of a dataset that is too large to be kept: its
+    shape and type and, if it is numeric, its statistics.
+    """
+    summary = {'shape': list(dataset.shape), 'dtype': str(dataset.dtype)}
+    if dataset.dtype.kind in 'biuf':
+        summary.update(dataset_statistics(dataset, max_bytes).as_dict())
+    return summary
+
+
+def strided_step(dataset: h5py.Dataset, max_points: int) -> int:
+    """
+    The step along every axis of `dataset` with which at most about `max_points`
+    values are read.
+    """
+    if dataset.size <= max_points or dataset.ndim == 0:
+        return 1
+    return math.ceil((dataset.size / max_points) ** (1 / dataset.ndim))
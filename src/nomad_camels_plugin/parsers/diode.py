@@ -0,0 +1,436 @@
+"""
+Analysis of the I-V curves of the diode demo measurement.
+
+Above its threshold a diode conducts and the current grows linearly with the
+voltage, the slope being the inverse of the series resistance. The linear region
+is found automatically and fitted with least squares. All curves of a
+measurement are stacked into 2-D arrays and fitted at once.
+"""
+
+import math
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .pipeline import ParseContext
+
+# Minimum number of points of the fitted linear region
+DEFAULT_MIN_POINTS = 5
+# Points with at least this fraction of the maximum current are conducting
+DEFAULT_CONDUCTING_FRACTION = 0.1
+# The fitted window contains at least this fraction of the conducting points
+DEFAULT_MIN_WINDOW_FRACTION = 0.25
+
+
+class DiodeFitError(ValueError):
+    """
+    Raised if an I-V curve has no linear region that can be fitted.
+    """
+
+
+class DiodeFit(NamedTuple):
+    """
+    The result of the linear fit of the conducting region of a diode.
+
+    Attributes:
+        slope: Slope of the fitted line in A/V.
+        intercept: Current of the fitted line at 0 V in A.
+        threshold_voltage: Voltage at which the fitted line crosses 0 A.
+        serial_resistance: Inverse of the slope.
+        threshold_voltage_error: Standard error of the threshold voltage.
+        serial_resistance_error: Standard error of the serial resistance.
+        r_squared: Coefficient of determination of the fit.
+        residuals: Measured minus fitted current of every point of the window.
+        start_voltage: The lowest voltage of the fitted window.
+        n_points: Number of points of the fitted window.
+    """
+
+    slope: float
+    intercept: float
+    threshold_voltage: float
+    serial_resistance: float
+    threshold_voltage_error: float
+    serial_resistance_error: float
+    r_squared: float
+    residuals: np.ndarray
+    start_voltage: float
+    n_points: int
+
+    @property
+    def residual_rms(self) -> float:
+        return float(np.sqrt(np.mean(self.residuals**2)))
+
+
+class DiodeFits(NamedTuple):
+    """
+    The results of the fits of many curves. Every attribute of `DiodeFit` is an
+    array with one element per curve, which is NaN if the curve was not fitted.
+
+    Attributes:
+        residuals: The residuals of all curves in the order of the sorted
+            voltages, NaN outside of the fitted windows.
+        residual_rms: Root mean square of the residuals of every curve.
+        errors: Why a curve was not fitted, `None` for fitted curves.
+    """
+
+    slope: np.ndarray
+    intercept: np.ndarray
+    threshold_voltage: np.ndarray
+    serial_resistance: np.ndarray
+    threshold_voltage_error: np.ndarray
+    serial_resistance_error: np.ndarray
+    r_squared: np.ndarray
+    residuals: np.ndarray
+    residual_rms: np.ndarray
+    start_voltage: np.ndarray
+    n_points: np.ndarray
+    errors: list[Optional[str]]
+
+    def curve(self, index: int) -> DiodeFit:
+        """
+        The fit of a single curve.
+
+        Raises:
+            DiodeFitError: If the curve was not fitted.
+        """
+        if self.errors[index] is not None:
+            raise DiodeFitError(self.errors[index])
+        residuals = self.residuals[index]
+        return DiodeFit(
+            slope=float(self.slope[index]),
+            intercept=float(self.intercept[index]),
+            threshold_voltage=float(self.threshold_voltage[index]),
+            serial_resistance=float(self.serial_resistance[index]),
+            threshold_voltage_error=float(self.threshold_voltage_error[index]),
+            serial_resistance_error=float(self.serial_resistance_error[index]),
+            r_squared=float(self.r_squared[index]),
+            residuals=residuals[np.isfinite(residuals)],
+            start_voltage=float(self.start_voltage[index]),
+            n_points=int(self.n_points[index]),
+        )
+
+
+def _stack(curves) -> np.ndarray:
+    """
+    Stack curves of different lengths into a 2-D array padded with NaN. The array
+    has at least one column, so that empty curves are reported like short ones.
+    """
+    if isinstance(curves, np.ndarray) and curves.ndim > 1 and curves.shape[1]:
+        return curves.astype(np.float64)
+    curves = [np.asarray(curve, dtype=np.float64).ravel() for curve in curves]
+    stacked = np.full((len(curves), max(map(len, curves), default=1) or 1), np.nan)
+    for row, curve in zip(stacked, curves):
+        row[: len(curve)] = curve
+    return stacked
+
+
+def _suffix_sum(values: np.ndarray) -> np.ndarray:
+    return np.cumsum(values[:, ::-1], axis=1)[:, ::-1]
+
+
+def _window_slope_errors(x: np.ndarray, y: np.ndarray, weights: np.ndarray):
+    """
+    The number of points, slope and relative standard error of the slope of the
+    linear fit of every window `x[:, k:], y[:, k:]` of every curve, computed at
+    once from suffix sums. Points with a weight of 0 are ignored.
+    """
+    n_valid = np.maximum(weights.sum(axis=1, keepdims=True), 1)
+    # Centering reduces the cancellation in the sums of squares
+    x = (x - (x * weights).sum(axis=1, keepdims=True) / n_valid) * weights
+    y = (y - (y * weights).sum(axis=1, keepdims=True) / n_valid) * weights
+    n, sx, sy, sxx, sxy, syy = (
+        _suffix_sum(values) for values in (weights, x, y, x * x, x * y, y * y)
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sxx_c = sxx - sx * sx / n
+        sxy_c = sxy - sx * sy / n
+        syy_c = syy - sy * sy / n
+        slope = sxy_c / sxx_c
+        sse = np.maximum(syy_c - slope * sxy_c, 0)
+        relative_error = np.sqrt(sse / (n - 2) / sxx_c) / slope
+    return n, slope, relative_error
+
+
+def fit_diodes(
+    voltages,
+    currents,
+    min_points: int = DEFAULT_MIN_POINTS,
+    conducting_fraction: float = DEFAULT_CONDUCTING_FRACTION,
+    min_window_fraction: float = DEFAULT_MIN_WINDOW_FRACTION,
+) -> DiodeFits:
+    """
+    Fit the linear region of many diode I-V curves at once.
+
+    The points of a curve may be measured in any order, e.g. in a negative sweep,
+    points that are not finite are ignored. For every curve, every window reaching
+    from a conducting point up to the highest voltage is a candidate. The one whose
+    slope has the lowest relative standard error is fitted: wider windows average
+    out the noise, but once they reach into the knee of the curve the curvature
+    increases the residuals.
+
+    Args:
+        voltages: The applied voltages in V, a 2-D array or a sequence of curves
+            of possibly different lengths.
+        currents: The measured currents in A, shaped like `voltages`.
+        min_points (int, optional): Minimum number of points of the window.
+        conducting_fraction (float, optional): Points with at least this
+            fraction of the maximum current are conducting.
+        min_window_fraction (float, optional): Minimum fraction of the
+            conducting points in the window.
+
+    Returns:
+        DiodeFits: The fit results of all curves.
+    """
+    x = _stack(voltages)
+    y = _stack(currents)
+    if x.shape != y.shape:
+        raise DiodeFitError('Voltages and currents have different shapes')
+    min_points = max(min_points, 3)
+    rows = np.arange(len(x))
+
+    # Sort every curve by voltage, invalid points go to the end
+    valid = np.isfinite(x) & np.isfinite(y)
+    order = np.argsort(np.where(valid, x, np.inf), axis=1, kind='stable')
+    x = np.take_along_axis(x, order, axis=1)
+    y = np.take_along_axis(y, order, axis=1)
+    valid = np.take_along_axis(valid, order, axis=1)
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+    n_valid = valid.sum(axis=1)
+
+    # Choose the window of every curve
+    y_max = np.where(valid, y, -np.inf).max(axis=1, initial=-np.inf)
+    conducting = valid & (y >= conducting_fraction * y_max[:, np.newaxis])
+    min_window = np.maximum(
+        min_points, (conducting.sum(axis=1) * min_window_fraction).astype(int)
+    )
+    n_window, window_slope, relative_error = _window_slope_errors(
+        x, y, valid.astype(np.float64)
+    )
+    candidates = (
+        conducting
+        & (n_window >= min_window[:, np.newaxis])
+        & (window_slope > 0)
+        & np.isfinite(relative_error)
+    )
+    start = np.argmin(np.where(candidates, relative_error, np.inf), axis=1)
+    has_window = candidates[rows, start] & (y_max > 0)
+
+    # Closed form least squares of the chosen windows
+    in_window = (
+        valid
+        & (np.arange(x.shape[1]) >= start[:, np.newaxis])
+        & has_window[:, np.newaxis]
+    )
+    w = in_window.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = w.sum(axis=1)
+        x_mean = (x * w).sum(axis=1) / n
+        y_mean = (y * w).sum(axis=1) / n
+        dx = (x - x_mean[:, np.newaxis]) * w
+        dy = (y - y_mean[:, np.newaxis]) * w
+        sxx = (dx * dx).sum(axis=1)
+        slope = (dx * dy).sum(axis=1) / sxx
+        intercept = y_mean - slope * x_mean
+        fitted_current = slope[:, np.newaxis] * x + intercept[:, np.newaxis]
+        residuals = np.where(in_window, y - fitted_current, np.nan)
+        sse = np.nansum(residuals**2, axis=1)
+        sst = (dy * dy).sum(axis=1)
+        r_squared = np.where(sst > 0, 1 - sse / sst, 1.0)
+
+        # Standard errors of the line parameters and their propagation
+        variance = sse / (n - 2)
+        var_slope = variance / sxx
+        var_intercept = variance * (1 / n + x_mean**2 / sxx)
+        covariance = -x_mean * variance / sxx
+        threshold_voltage = -intercept / slope
+        var_threshold = (
+            var_intercept / slope**2
+            + intercept**2 * var_slope / slope**4
+            - 2 * intercept * covariance / slope**3
+        )
+        serial_resistance = 1 / slope
+        serial_resistance_error = np.sqrt(var_slope) / slope**2
+        residual_rms = np.sqrt(sse / n)
+
+    fitted = has_window & (sxx > 0) & (slope > 0)
+    errors = [None] * len(x)
+    for index in np.flatnonzero(~fitted):
+        if n_valid[index] < min_points:
+            errors[index] = f'The curve has less than {min_points} valid points'
+        elif y_max[index] <= 0:
+            errors[index] = 'The diode does not conduct'
+        elif not has_window[index]:
+            errors[index] = (
+                f'The curve has less than {min_window[index]} conducting points to fit'
+            )
+        else:
+            errors[index] = 'The current does not increase with the voltage'
+
+    def only_fitted(values):
+        return np.where(fitted, values, np.nan)
+
+    return DiodeFits(
+        slope=only_fitted(slope),
+        intercept=only_fitted(intercept),
+        threshold_voltage=only_fitted(threshold_voltage),
+        serial_resistance=only_fitted(serial_resistance),
+        threshold_voltage_error=only_fitted(np.sqrt(np.maximum(var_threshold, 0))),
+        serial_resistance_error=only_fitted(serial_resistance_error),
+        r_squared=only_fitted(r_squared),
+        residuals=np.where(fitted[:, np.newaxis], residuals, np.nan),
+        residual_rms=only_fitted(residual_rms),
+        start_voltage=only_fitted(x[rows, start]),
+        n_points=np.where(fitted, n, 0).astype(np.int64),
+        errors=errors,
+    )
+
+
+def fit_diode(
+    voltage,
+    current,
+    min_points: int = DEFAULT_MIN_POINTS,
+    conducting_fraction: float = DEFAULT_CONDUCTING_FRACTION,
+    min_window_fraction: float = DEFAULT_MIN_WINDOW_FRACTION,
+) -> DiodeFit:
+    """
+    Fit the linear region of a single diode I-V curve, see `fit_diodes`.
+
+    Raises:
+        DiodeFitError: If the curve has no region that can be fitted.
+    """
+    voltage = np.asarray(voltage, dtype=np.float64).ravel()
+    current = np.asarray(current, dtype=np.float64).ravel()
+    if voltage.shape != current.shape:
+        raise DiodeFitError('Voltage and current have different lengths')
+    fits = fit_diodes(
+        [voltage], [current], min_points, conducting_fraction, min_window_fraction
+    )
+    return fits.curve(0)
+
+
+def measured_curves(figures: dict[str, dict]) -> list[tuple[str, dict]]:
+    """
+    All measured traces of the figures, i.e. the traces with markers and 1-D x and
+    y data. Lines, e.g. of fits, are not measured curves.
+
+    Returns:
+        list[tuple[str, dict]]: The figure key and the trace of every curve.
+    """
+    curves = []
+    for figure_key, figure in figures.items():
+        for trace in figure['data']:
+            if (
+                'markers' in (trace.get('mode') or '')
+                and trace.get('x') is not None
+                and trace.get('y') is not None
+                and np.ndim(trace['x']) == 1
+                and np.shape(trace['x']) == np.shape(trace['y'])
+            ):
+                curves.append((figure_key, trace))
+    return curves
+
+
+def read_curve(x, y, max_points: int = 0) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    Read the voltages `x` and the currents `y` of a measured curve, which can be
+    h5py datasets. Only every n-th point of curves with more than `max_points`
+    points is read, 0 reads all points.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, int]: The voltages, the currents and the
+        step with which they were read.
+    """
+    n_points = len(y)
+    step = math.ceil(n_points / max_points) if 0 < max_points < n_points else 1
+    return (
+        np.asarray(x[::step], dtype=np.float64),
+        np.asarray(y[::step], dtype=np.float64),
+        step,
+    )
+
+
+def store_diode_fit(data, fit: DiodeFit) -> None:
+    """
+    Set the fit result on the `CamelsMeasurementDiode` section `data`.
+    """
+    data.threshold_voltage = fit.threshold_voltage
+    data.threshold_voltage_error = fit.threshold_voltage_error
+    data.serial_resistance = fit.serial_resistance
+    data.serial_resistance_error = fit.serial_resistance_error
+    data.fit_r_squared = fit.r_squared
+    data.fit_residual_rms = fit.residual_rms
+    data.fit_start_voltage = fit.start_voltage
+    data.fit_points = fit.n_points
+
+
+def store_diode_fits(data, curves: Sequence[tuple[str, dict]], fits: DiodeFits) -> None:
+    """
+    Add the fit of every curve as `DiodeCurveFit` to the `CamelsMeasurementDiode`
+    section `data`. The scalar fit quantities of `data` are set to the fit of the
+    first fitted curve.
+    """
+    from nomad_camels_plugin.schema_packages.camels_package import DiodeCurveFit
+
+    first_fitted = next(
+        (index for index, error in enumerate(fits.errors) if error is None), None
+    )
+    if first_fitted is not None:
+        store_diode_fit(data, fits.curve(first_fitted))
+    for index, (figure_key, trace) in enumerate(curves):
+        curve_fit = DiodeCurveFit(figure=figure_key, curve=trace.get('name'))
+        if fits.errors[index] is None:
+            curve_fit.threshold_voltage = fits.threshold_voltage[index]
+            curve_fit.threshold_voltage_error = fits.threshold_voltage_error[index]
+            curve_fit.serial_resistance = fits.serial_resistance[index]
+            curve_fit.serial_resistance_error = fits.serial_resistance_error[index]
+            curve_fit.r_squared = fits.r_squared[index]
+            curve_fit.residual_rms = fits.residual_rms[index]
+            curve_fit.start_voltage = fits.start_voltage[index]
+            curve_fit.n_points = fits.n_points[index]
+        else:
+            curve_fit.error = fits.errors[index]
+        data.curve_fits.append(curve_fit)
+
+
+def analyse_diode_curves(context: 'ParseContext') -> None:
+    """
+    Analysis stage of the diode measurement: fits all measured curves of the
+    figures at once, stores the results and adds the fitted lines to the figures.
+    """
+    curves = measured_curves(context.figures)
+    # The trace data can still be h5py datasets, with a memory limit long curves
+    # are fitted with every n-th point
+    max_points = context.figure_options['max_points'] if context.memory_limit else 0
+    voltages, currents = [], []
+    for figure_key, trace in curves:
+        x, y, step = read_curve(trace['x'], trace['y'], max_points)
+        if step > 1:
+            context.logger.info(
+                f'The diode curve {figure_key} is fitted with every {step}th point '
+                f'to stay within the memory limit'
+            )
+        voltages.append(x)
+        currents.append(y)
+    fits = fit_diodes(voltages, currents)
+    store_diode_fits(context.data, curves, fits)
+    for index, (figure_key, trace) in enumerate(curves):
+        if fits.errors[index] is not None:
+            context.logger.warning(
+                f'Could not fit the diode curve {figure_key}: {fits.errors[index]}'
+            )
+            continue
+        # The fitted straight line only needs its end points
+        x_ends = np.array([np.nanmin(voltages[index]), np.nanmax(voltages[index])])
+        context.figures[figure_key]['data'].append(
+            {
+                'type': 'scatter',
+                'mode': 'lines',
+                'name': 'Fit Line',
+                'x': x_ends,
+                'y': fits.slope[index] * x_ends + fits.intercept[index],
+                'line': {'dash': 'dash'},
+            }
+        )
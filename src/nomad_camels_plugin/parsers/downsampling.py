@@ -0,0 +1,238 @@
+"""
+Shape preserving downsampling of long traces for the figures shown in NOMAD.
+"""
+
+from collections.abc import Callable, Iterator
+from enum import Enum
+from typing import Optional
+
+import numpy as np
+
+
+class DownsamplingMethod(str, Enum):
+    """
+    LTTB: Largest triangle three buckets, keeps the visually most important point
+        of every bucket.
+    MINMAX: Keeps the minimum and maximum of every bucket, so no peak is lost.
+    """
+
+    LTTB = 'lttb'
+    MINMAX = 'minmax'
+
+
+def _bucket_edges(n_points: int, n_buckets: int) -> np.ndarray:
+    # The first and the last point are always kept and not part of a bucket
+    return np.linspace(1, n_points - 1, n_buckets + 1).astype(np.int64)
+
+
+def _first_argmax_per_bucket(
+    values: np.ndarray, starts: np.ndarray, bucket_of_point: np.ndarray
+) -> np.ndarray:
+    maxima = np.maximum.reduceat(values, starts)
+    candidates = np.flatnonzero(values == maxima[bucket_of_point])
+    _, first = np.unique(bucket_of_point[candidates], return_index=True)
+    return candidates[first]
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the points kept by the largest triangle three buckets algorithm.
+
+    The triangle of every point is spanned with the averages of the previous and
+    the next bucket instead of the point selected in the previous bucket. This
+    removes the sequential dependency, so all buckets are processed at once.
+
+    Args:
+        x (np.ndarray): The x values, sorted.
+        y (np.ndarray): The y values.
+        n_out (int): The number of points to keep, at least 3.
+
+    Returns:
+        np.ndarray: The sorted indices of the kept points.
+    """
+    n_points = len(y)
+    if n_out >= n_points or n_out < 3:
+        return np.arange(n_points)
+    edges = _bucket_edges(n_points, n_out - 2)
+    starts = edges[:-1]
+    inner = np.arange(1, n_points - 1)
+    bucket_of_point = np.searchsorted(edges, inner, side='right') - 1
+    counts = np.bincount(bucket_of_point, minlength=len(starts))
+    x_mean = np.bincount(bucket_of_point, weights=x[1:-1], minlength=len(starts))
+    y_mean = np.bincount(bucket_of_point, weights=y[1:-1], minlength=len(starts))
+    x_mean /= counts
+    y_mean /= counts
+    # The first and last point act as neighbours of the outermost buckets
+    x_anchor = np.concatenate(([x[0]], x_mean, [x[-1]]))
+    y_anchor = np.concatenate(([y[0]], y_mean, [y[-1]]))
+    ax = x_anchor[bucket_of_point]
+    ay = y_anchor[bucket_of_point]
+    cx = x_anchor[bucket_of_point + 2]
+    cy = y_anchor[bucket_of_point + 2]
+    area = np.abs((ax - cx) * (y[1:-1] - ay) - (ax - x[1:-1]) * (cy - ay))
+    area = np.nan_to_num(area, nan=-1.0)
+    selected = _first_argmax_per_bucket(area, starts - 1, bucket_of_point) + 1
+    return np.concatenate(([0], selected, [n_points - 1]))
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the minimum and maximum of every bucket, plus the first and the
+    last point.
+
+    Args:
+        y (np.ndarray): The y values.
+        n_out (int): The maximum number of points to keep, at least 4.
+
+    Returns:
+        np.ndarray: The sorted indices of the kept points.
+    """
+    n_points = len(y)
+    if n_out >= n_points or n_out < 4:
+        return np.arange(n_points)
+    edges = _bucket_edges(n_points, (n_out - 2) // 2)
+    starts = edges[:-1]
+    inner = np.arange(1, n_points - 1)
+    bucket_of_point = np.searchsorted(edges, inner, side='right') - 1
+    values = y[1:-1]
+    # NaN would win every comparison, so it is never selected
+    maxima = _first_argmax_per_bucket(
+        np.where(np.isnan(values), -np.inf, values), starts - 1, bucket_of_point
+    )
+    minima = _first_argmax_per_bucket(
+        np.where(np.isnan(values), -np.inf, -values), starts - 1, bucket_of_point
+    )
+    selected = np.union1d(maxima, minima) + 1
+    return np.concatenate(([0], selected, [n_points - 1]))
+
+
+def downsample(
+    x: np.ndarray, y: np.ndarray, n_out: int, method: DownsamplingMethod
+) -> np.ndarray:
+    """
+    Get the indices of the points of a trace that are kept when it is reduced to
+    at most `n_out` points.
+
+    Args:
+        x (np.ndarray): The x values of the trace.
+        y (np.ndarray): The y values of the trace.
+        n_out (int): The point budget of the trace.
+        method (DownsamplingMethod): The downsampling algorithm.
+
+    Returns:
+        np.ndarray: The sorted indices of the kept points.
+    """
+    if DownsamplingMethod(method) is DownsamplingMethod.MINMAX:
+        return minmax_indices(y, n_out)
+    return lttb_indices(x, y, n_out)
+
+
+class _BucketArgmax:
+    """
+    The first maximum of every bucket, and the point it belongs to, of values
+    that are added block by block in ascending order of their indices.
+    """
+
+    def __init__(self, n_buckets: int):
+        self.value = np.full(n_buckets, -np.inf)
+        self.index = np.full(n_buckets, -1, dtype=np.int64)
+        self.x = np.full(n_buckets, np.nan)
+        self.y = np.full(n_buckets, np.nan)
+
+    def update(self, buckets, values, indices, x, y) -> None:
+        if not len(buckets):
+            return
+        unique, starts, inverse = np.unique(
+            buckets, return_index=True, return_inverse=True
+        )
+        first = _first_argmax_per_bucket(values, starts, inverse)
+        # A bucket continued from the previous block keeps its first maximum
+        better = (self.index[unique] < 0) | (values[first] > self.value[unique])
+        buckets, first = unique[better], first[better]
+        self.value[buckets] = values[first]
+        self.index[buckets] = indices[first]
+        self.x[buckets] = x[first]
+        self.y[buckets] = y[first]
+
+
+def downsample_blocks(
+    read_blocks: Callable[[], Iterator[tuple[int, np.ndarray, np.ndarray]]],
+    n_points: int,
+    n_out: int,
+    method: DownsamplingMethod,
+    on_block: Optional[Callable[[np.ndarray], None]] = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Downsample a trace that is read block by block, like `downsample` but
+    without holding the trace in memory. LTTB reads the trace twice, MINMAX
+    once.
+
+    Args:
+        read_blocks (Callable): Returns an iterator over the start index and the
+            x and y values of consecutive blocks of the trace.
+        n_points (int): The number of points of the trace, more than `n_out`.
+        n_out (int): The point budget of the trace, at least 4.
+        method (DownsamplingMethod): The downsampling algorithm.
+        on_block (Callable, optional): Called with the y values of every block
+            of the first read.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: The sorted indices and the x and
+        y values of the kept points.
+    """
+    ends = {}
+    minmax = DownsamplingMethod(method) is DownsamplingMethod.MINMAX
+    n_buckets = (n_out - 2) // 2 if minmax else n_out - 2
+    edges = _bucket_edges(n_points, n_buckets)
+
+    def inner_blocks(first_read: bool):
+        for start, x_block, y_block in read_blocks():
+            x = np.asarray(x_block, dtype=np.float64)
+            y = np.asarray(y_block, dtype=np.float64)
+            if first_read and on_block is not None:
+                on_block(y)
+            indices = np.arange(start, start + len(y))
+            for end in (0, n_points - 1):
+                if start <= end < start + len(y):
+                    ends[end] = (x[end - start], y[end - start])
+            inner = (indices >= 1) & (indices < n_points - 1)
+            buckets = np.searchsorted(edges, indices[inner], side='right') - 1
+            yield buckets, indices[inner], x[inner], y[inner]
+
+    if minmax:
+        selections = (_BucketArgmax(n_buckets), _BucketArgmax(n_buckets))
+        for buckets, indices, x, y in inner_blocks(True):
+            # NaN would win every comparison, so it is never selected
+            for selection, values in zip(selections, (y, -y)):
+                selection.update(
+                    buckets, np.where(np.isnan(values), -np.inf, values), indices, x, y
+                )
+    else:
+        counts = np.zeros(n_buckets)
+        x_sum = np.zeros(n_buckets)
+        y_sum = np.zeros(n_buckets)
+        for buckets, _, x, y in inner_blocks(True):
+            counts += np.bincount(buckets, minlength=n_buckets)
+            x_sum += np.bincount(buckets, weights=x, minlength=n_buckets)
+            y_sum += np.bincount(buckets, weights=y, minlength=n_buckets)
+        (x_first, y_first), (x_last, y_last) = ends[0], ends[n_points - 1]
+        x_anchor = np.concatenate(([x_first], x_sum / counts, [x_last]))
+        y_anchor = np.concatenate(([y_first], y_sum / counts, [y_last]))
+        selections = (_BucketArgmax(n_buckets),)
+        for buckets, indices, x, y in inner_blocks(False):
+            ax, ay = x_anchor[buckets], y_anchor[buckets]
+            cx, cy = x_anchor[buckets + 2], y_anchor[buckets + 2]
+            area = np.abs((ax - cx) * (y - ay) - (ax - x) * (cy - ay))
+            selections[0].update(buckets, np.nan_to_num(area, nan=-1.0), indices, x, y)
+
+    indices = np.concatenate(
+        [[0, n_points - 1], *(selection.index for selection in selections)]
+    )
+    x = np.concatenate(
+        [[ends[0][0], ends[n_points - 1][0]], *(s.x for s in selections)]
+    )
+    y = np.concatenate(
+        [[ends[0][1], ends[n_points - 1][1]], *(s.y for s in selections)]
+    )
+    indices, unique = np.unique(indices, return_index=True)
+    return indices, x[unique], y[unique]
@@ -0,0 +1,439 @@
+"""
+Extraction of the CAMELS entry contents into the measurement section.
+"""
+
+import json
+import re
+from collections.abc import Callable
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional
+
+import h5py
+import numpy as np
+from nomad.datamodel.metainfo.basesections import (
+    CompositeSystemReference,
+    InstrumentReference,
+)
+
+from nomad_camels_plugin.schema_packages.camels_package import (
+    CamelsChannel,
+    ChannelStatistics,
+)
+
+from .chunked import MIN_BLOCK_BYTES, dataset_statistics, dataset_summary
+
+if TYPE_CHECKING:
+    from structlog.stdlib import (
+        BoundLogger,
+    )
+
+
+def decode_str(value: bytes) -> str:
+    return value.decode('utf-8')
+
+
+def decode_datetime(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode('utf-8'))
+
+
+def decode_rich_text(value: bytes) -> str:
+    # encode the spaces and new line characters in HTML so that the richtext field
+    # displays them correctly
+    return (
+        value.decode('utf-8')
+        .replace('\n', '<br>')
+        .replace(
+            '\t', '&nbsp;&nbsp;&nbsp;&nbsp;'
+        )  # Replace tabs with four non-breaking spaces
+        .replace(' ', '&nbsp;')
+    )
+
+
+def decode_json(value: bytes) -> Any:
+    return json.loads(value.decode('utf-8'))
+
+
+def decode_tags(value) -> list[str]:
+    return [item.decode('utf-8') for item in value]
+
+
+def decode_plan_name(value: bytes) -> str:
+    return value.decode('utf-8').removesuffix('_plan')
+
+
+class DetailField(NamedTuple):
+    """
+    Describes how a dataset of the `measurement_details` group is read.
+
+    Attributes:
+        dataset: Name of the dataset in the `measurement_details` group.
+        quantity: Name of the quantity of the measurement section that is set.
+        decoder: Converts the raw value read from the dataset.
+        required: If True, a missing dataset raises a KeyError.
+        default: Value that is set if an optional dataset is missing.
+        missing_warning: Logged if an optional dataset is missing.
+    """
+
+    dataset: str
+    quantity: str
+    decoder: Callable[[Any], Any]
+    required: bool = True
+    default: Any = None
+    missing_warning: Optional[str] = None
+
+
+MEASUREMENT_DETAILS_FIELDS = (
+    DetailField('start_time', 'datetime', decode_datetime),
+    DetailField('protocol_description', 'protocol_description', decode_rich_text),
+    DetailField('measurement_description', 'measurement_description', decode_rich_text),
+    DetailField('measurement_tags', 'measurement_tags', decode_tags),
+    DetailField(
+        'measurement_comments',
+        'measurement_comments',
+        decode_rich_text,
+        required=False,
+        default='',
+    ),
+    DetailField('protocol_overview', 'protocol_overview', decode_rich_text),
+    DetailField('plan_name', 'protocol_name', decode_plan_name),
+    DetailField('protocol_json', 'protocol_json', decode_json),
+    DetailField('end_time', 'end_time', decode_datetime),
+    DetailField('session_name', 'session_name', decode_str),
+    DetailField(
+        'python_script',
+        'camels_python_script',
+        decode_str,
+        required=False,
+        missing_warning='No python script found in the CAMELS file',
+    ),
+)
+
+
+def read_measurement_details(
+    entry_group: 'h5py.Group',
+    data,
+    logger: 'BoundLogger',
+    fields: tuple[DetailField, ...] = MEASUREMENT_DETAILS_FIELDS,
+) -> None:
+    """
+    Reads all `fields` from the `measurement_details` group of the CAMELS entry
+    and sets them on `data`.
+
+    The `measurement_details` group is resolved once and every dataset is looked
+    up only once.
+
+    Args:
+        entry_group (h5py.Group): The CAMELS entry group of the file.
+        data: The measurement section that is filled.
+        logger (BoundLogger): A structlog logger.
+        fields (tuple[DetailField, ...], optional): The fields to read.
+    """
+    details = entry_group['measurement_details']
+    for field in fields:
+        dataset = details.get(field.dataset)
+        if dataset is None:
+            if field.required:
+                raise KeyError(
+                    f'Required dataset "{field.dataset}" not found in '
+                    'measurement_details'
+                )
+            if field.missing_warning:
+                logger.warning(field.missing_warning)
+            if field.default is not None:
+                setattr(data, field.quantity, field.default)
+            continue
+        setattr(data, field.quantity, field.decoder(dataset[()]))
+
+
+def decode_sample_value(value) -> str:
+    # Sample ids and names may be stored as integers
+    if isinstance(value, (int, np.integer)):
+        return str(value)
+    return value.decode('utf-8')
+
+
+def read_sample(entry_group: h5py.Group, data, logger: 'BoundLogger') -> None:
+    """
+    References the sample of the CAMELS entry in `data.samples`.
+
+    Samples from NOMAD are referenced by their entry, other samples are only
+    added with their name and id.
+
+    Args:
+        entry_group (h5py.Group): The CAMELS entry group of the file.
+        data: The measurement section that is filled.
+        logger (BoundLogger): A structlog logger.
+    """
+    try:
+        sample_name = entry_group['sample']['name'][()].decode('utf-8')
+    except KeyError:
+        logger.warning('No sample name found in the CAMELS file')
+        sample_name = ''
+    try:
+        full_identifier = entry_group['sample']['identifier']['full_identifier'][()]
+    except KeyError:
+        logger.warning('No NOMAD sample found in the CAMELS file')
+    else:
+        # Extract the upload id and entry id from the full sample id
+        sample_upload_id, sample_entry_id = re.findall(
+            r'upload/id/([^/]+)/entry/id/([^/]+)', full_identifier.decode('utf-8')
+        )[0]
+        data.samples = [
+            CompositeSystemReference(
+                name=f'{sample_name}',
+                reference=f'../uploads/{sample_upload_id}/archive/{sample_entry_id}#/data',
+            )
+        ]
+        return
+    try:
+        sample_id = decode_sample_value(entry_group['sample']['sample_id'][()])
+        sample_name = decode_sample_value(entry_group['sample']['name'][()])
+    except KeyError:
+        data.samples = [CompositeSystemReference(name=f'{sample_name}')]
+        logger.warning(
+            'No sample found in the NOMAD server. Only using the sample name.'
+        )
+        return
+    if len(sample_id) == 0:
+        data.samples = [CompositeSystemReference(name=f'{sample_name}')]
+    else:
+        data.samples = [CompositeSystemReference(name=f'{sample_name} ID:{sample_id}')]
+
+
+def try_convert_to_number(value):
+    # Attempt to convert string to a number (int or float)
+    # If it's not numeric, just return the original value.
+    try:
+        # Try int first
+        int_val = int(value)
+        return int_val
+    except (ValueError, TypeError):
+        pass
+
+    try:
+        # Try float if int fails
+        float_val = float(value)
+        return float_val
+    except (ValueError, TypeError):
+        # If both fail, return original value
+        return value
+
+
+def decode_settings_value(value):
+    """
+    Converts a value read from a settings dataset into a JSON serializable
+    Python object. Byte strings are decoded and strings that contain a number are
+    converted to that number.
+    """
+    if isinstance(value, np.ndarray):
+        if value.size == 1:
+            value = value.item()
+        else:
+            return decode_settings_array(value)
+    elif isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    if isinstance(value, str):
+        return try_convert_to_number(value)
+    return value
+
+
+def decode_settings_array(value: np.ndarray) -> list:
+    """
+    Converts a multi-element settings array into a (nested) list in bulk.
+
+    Numeric arrays are converted directly. Byte string arrays are decoded at once
+    and converted to integers or floats if all their elements are numeric, like
+    `try_convert_to_number` would do element by element.
+    """
+    if value.dtype.kind in 'biuf':
+        return value.tolist()
+    if value.dtype.kind == 'O':
+        # Variable length strings are returned by h5py as object arrays of bytes
+        if not all(isinstance(item, (bytes, str)) for item in value.flat):
+            return [decode_settings_value(item) for item in value.tolist()]
+        value = value.astype(np.bytes_ if isinstance(value.flat[0], bytes) else str)
+    if value.dtype.kind == 'S':
+        value = np.char.decode(value, 'utf-8')
+    if value.dtype.kind != 'U':
+        return value.tolist()
+    try:
+        return value.astype(np.int64).tolist()
+    except (ValueError, OverflowError):
+        pass
+    try:
+        floats = value.astype(np.float64)
+    except ValueError:
+        # At least one element is not numeric, only convert the numeric ones
+        return _convert_each(value)
+    stripped = np.char.lstrip(np.char.strip(value), '+-')
+    is_int = np.char.isdigit(stripped)
+    if not is_int.any():
+        return floats.tolist()
+    mixed = floats.astype(object)
+    try:
+        mixed[is_int] = value[is_int].astype(np.int64).astype(object)
+    except OverflowError:
+        # Python ints are not limited to 64 bits
+        return _convert_each(value)
+    return mixed.tolist()
+
+
+def _convert_each(value: np.ndarray) -> list:
+    return (
+        np.array(
+            [try_convert_to_number(item) for item in value.ravel().tolist()],
+            dtype=object,
+        )
+        .reshape(value.shape)
+        .tolist()
+    )
+
+
+def read_settings_group(
+    group: h5py.Group, max_value_bytes: Optional[int] = None
+) -> dict:
+    """
+    Recursively reads a settings group of arbitrary depth into a nested dict.
+    Datasets larger than `max_value_bytes` are replaced by their summary, see
+    `dataset_summary`.
+    """
+    settings = {}
+    for key, item in group.items():
+        if isinstance(item, h5py.Group):
+            settings[key] = read_settings_group(item, max_value_bytes)
+        elif max_value_bytes is not None and item.nbytes > max_value_bytes:
+            settings[key] = dataset_summary(item, max_value_bytes)
+        else:
+            settings[key] = decode_settings_value(item[()])
+    return settings
+
+
+def read_instruments(
+    entry_group: h5py.Group, max_value_bytes: Optional[int] = None
+) -> tuple[list, dict]:
+    """
+    Walks the `instruments` group of the CAMELS entry once and collects the
+    references to the instruments and their settings.
+
+    Args:
+        entry_group (h5py.Group): The CAMELS entry group of the file.
+        max_value_bytes (int, optional): Settings datasets that are larger are
+            stored as their summary instead of their values.
+
+    Returns:
+        tuple[list, dict]: The list of `InstrumentReference`s and a dict that maps
+        every instrument name to its nested settings.
+    """
+    instrument_references = []
+    settings_dict = {}  # Dictionary to hold all instruments and their settings
+    for instrument_name, instrument in entry_group['instruments'].items():
+        # Reference the ELN entry of the instrument if the metadata exists
+        full_identifier = instrument.get('fabrication/ELN-metadata/full_identifier')
+        if full_identifier is None:
+            instrument_references.append(InstrumentReference(name=instrument_name))
+        else:
+            instrument_upload_id, instrument_entry_id = re.findall(
+                r'upload/id/([^/]+)/entry/id/([^/]+)',
+                full_identifier[()].decode('utf-8'),
+            )[0]
+            instrument_references.append(
+                InstrumentReference(
+                    name=instrument_name,
+                    reference=f'../uploads/{instrument_upload_id}/archive/{instrument_entry_id}#/data',
+                )
+            )
+        settings = instrument.get('settings')
+        settings_dict[instrument_name] = (
+            read_settings_group(settings, max_value_bytes)
+            if settings is not None
+            else {}
+        )
+    return instrument_references, settings_dict
+
+
+def decode_attribute(value) -> str:
+    # Attributes are read as str, or as bytes if they were written as bytes
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return str(value)
+
+
+def find_channels(entry_group: h5py.Group) -> list[tuple[str, h5py.Dataset]]:
+    """
+    All datasets in the `data` group of the CAMELS entry with their paths relative
+    to it. The datasets of the `plot_*` groups repeat the data of their stream and
+    are skipped. Only the metadata of the file is read.
+    """
+    data_group = entry_group.get('data')
+    if not isinstance(data_group, h5py.Group):
+        return []
+    channels = []
+
+    def visit(path, item):
+        if isinstance(item, h5py.Dataset) and not any(
+            part.startswith('plot_') for part in path.split('/')[:-1]
+        ):
+            channels.append((path, item))
+
+    data_group.visititems(visit)
+    return channels
+
+
+def read_channel_catalog(entry_group: h5py.Group, data) -> None:
+    """
+    Appends the name, shape, dtype, units and chunking of every channel of the
+    CAMELS entry to `data.channels`, without reading their values.
+
+    Args:
+        entry_group (h5py.Group): The CAMELS entry group of the file.
+        data: The measurement section that is filled.
+    """
+    for path, dataset in find_channels(entry_group):
+        units = dataset.attrs.get('units')
+        data.channels.append(
+            CamelsChannel(
+                name=path.rsplit('/', 1)[-1],
+                path=path,
+                shape=list(dataset.shape),
+                dtype='string'
+                if h5py.check_string_dtype(dataset.dtype)
+                else str(dataset.dtype),
+                units=None if units is None else decode_attribute(units),
+                chunks=None if dataset.chunks is None else list(dataset.chunks),
+            )
+        )
+
+
+def read_channel_statistics(
+    entry_group: h5py.Group, data, max_bytes: int = MIN_BLOCK_BYTES
+) -> None:
+    """
+    Computes the statistics of every numeric dataset in the `data` group of the
+    CAMELS entry and appends them to `data.channel_statistics`.
+
+    The datasets are read in blocks of at most `max_bytes`, see `find_channels`
+    for the datasets that are channels.
+
+    Args:
+        entry_group (h5py.Group): The CAMELS entry group of the file.
+        data: The measurement section that is filled.
+        max_bytes (int, optional): The size of the blocks read at once.
+    """
+    for path, dataset in find_channels(entry_group):
+        if dataset.dtype.kind not in 'biuf' or dataset.ndim == 0:
+            continue
+        statistics = dataset_statistics(dataset, max_bytes)
+        data.channel_statistics.append(
+            ChannelStatistics(
+                name=path.rsplit('/', 1)[-1],
+                path=path,
+                count=statistics.count,
+                nan_count=statistics.nan_count,
+                minimum=statistics.minimum,
+                maximum=statistics.maximum,
+                mean=statistics.mean,
+                std=statistics.std,
+            )
+        )
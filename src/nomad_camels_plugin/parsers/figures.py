@@ -0,0 +1,350 @@
+"""
+Conversion of the plots recreated from a CAMELS file into figures of the
+measurement section.
+"""
+
+from enum import Enum
+
+import h5py
+import numpy as np
+from nomad.datamodel.metainfo.plot import PlotlyFigure
+
+from nomad_camels_plugin.schema_packages.camels_package import (
+    CamelsFigureReference,
+    CamelsFigureTrace,
+)
+
+from .chunked import MIN_BLOCK_BYTES, RunningStatistics, iter_blocks, strided_step
+from .downsampling import DownsamplingMethod, downsample, downsample_blocks
+
+# The attributes of a Plotly trace that hold its data
+TRACE_DATA_KEYS = ('x', 'y', 'z')
+
+
+class FigureMode(str, Enum):
+    """
+    How the plots of a CAMELS file are stored in the archive.
+
+    INLINE: As Plotly figures including all plotted values.
+    REFERENCE: Only the layout and the trace metadata are stored, the plotted
+        values are referenced in the CAMELS file.
+    """
+
+    INLINE = 'inline'
+    REFERENCE = 'reference'
+
+
+def plot_data_group(entry_group: h5py.Group, figure_key: str) -> h5py.Group:
+    """
+    Get the group of the CAMELS entry that holds the data of a recreated plot.
+
+    Args:
+        entry_group (h5py.Group): The CAMELS entry group of the file.
+        figure_key (str): The key of the figure returned by `recreate_plots`. This
+            is either the path of the plot group or `<stream>: <plot name>` for
+            files written by older CAMELS versions.
+    """
+    if figure_key.startswith('/'):
+        group = entry_group.file.get(figure_key)
+    else:
+        stream = figure_key.split(': ', 1)[0]
+        group = entry_group['data'].get(stream)
+    if not isinstance(group, h5py.Group):
+        # The primary stream is stored directly in the data group
+        return entry_group['data']
+    return group
+
+
+def _reduce_calculated_data(
+    trace: CamelsFigureTrace,
+    trace_json: dict,
+    trace_metadata: dict,
+    max_points: int,
+    method: DownsamplingMethod,
+) -> None:
+    """
+    Keep the reference figure small if the data of a trace have no dataset, e.g.
+    of fits. Long x-y traces are downsampled, other long data are omitted.
+    """
+    long_keys = [
+        key
+        for key in TRACE_DATA_KEYS
+        if trace_metadata.get(key) is not None
+        and np.size(trace_metadata[key]) > max_points
+    ]
+    if max_points <= 0 or not long_keys:
+        return
+    meta = trace_metadata.get('meta')
+    meta = dict(meta) if isinstance(meta, dict) else {}
+    y = np.asarray(trace_json['y']) if trace_json.get('y') is not None else None
+    x = np.asarray(trace_json['x']) if trace_json.get('x') is not None else None
+    if (
+        'y' in long_keys
+        and 'z' not in long_keys
+        and y.ndim == 1
+        and y.dtype.kind in 'biuf'
+        and (x is None or (x.shape == y.shape and x.dtype.kind in 'biuf'))
+    ):
+        x_values = np.arange(len(y)) if x is None else x
+        indices = downsample(
+            x_values.astype(np.float64), y.astype(np.float64), max_points, method
+        )
+        trace_metadata['y'] = y[indices]
+        if x is not None:
+            # The downsampled x values are stored with the y values
+            trace_metadata['x'] = x[indices]
+            if trace.x is not None:
+                meta['full_resolution'] = {'x': trace.x}
+                trace.x = None
+        meta['downsampling'] = DownsamplingMethod(method).value
+        meta['measured_points'] = len(y)
+    else:
+        for key in long_keys:
+            del trace_metadata[key]
+        meta['omitted'] = long_keys
+    trace_metadata['meta'] = meta
+
+
+def reference_figure(
+    figure_key: str,
+    figure_json: dict,
+    entry_group: h5py.Group,
+    hdf5_path: str,
+    max_points: int = 0,
+    downsampling: DownsamplingMethod = DownsamplingMethod.LTTB,
+) -> CamelsFigureReference:
+    """
+    Create a figure that references the plotted data in the CAMELS file instead of
+    containing it.
+
+    Only trace data that are still h5py datasets, see `build_figures` with
+    `lazy`, are referenced. Other data were calculated when the plot was
+    recreated, e.g. of fits or formulas, and are kept in the trace metadata.
+
+    Args:
+        figure_key (str): The key of the figure returned by `recreate_plots`.
+        figure_json (dict): The Plotly JSON of the figure.
+        entry_group (h5py.Group): The CAMELS entry group of the file.
+        hdf5_path (str): The path of the CAMELS file inside the upload.
+        max_points (int, optional): The point budget of the data that are not in
+            the CAMELS file, 0 keeps them all.
+        downsampling (DownsamplingMethod, optional): The downsampling algorithm.
+
+    Returns:
+        CamelsFigureReference: The figure with the layout and trace metadata.
+    """
+    group = plot_data_group(entry_group, figure_key)
+    layout = dict(figure_json.get('layout', {}))
+    # The default Plotly template is the same for every plot
+    layout.pop('template', None)
+    figure = CamelsFigureReference(
+        name=figure_key,
+        layout=layout,
+        data_group=f'{hdf5_path}#{group.name}',
+    )
+    for trace_json in figure_json.get('data', []):
+        trace_metadata = dict(trace_json)
+        trace = CamelsFigureTrace(name=trace_json.get('name'))
+        for key in TRACE_DATA_KEYS:
+            dataset = trace_metadata.get(key)
+            if isinstance(dataset, h5py.Dataset):
+                setattr(trace, key, f'{hdf5_path}#{dataset.name}')
+                del trace_metadata[key]
+        _reduce_calculated_data(
+            trace, trace_json, trace_metadata, max_points, downsampling
+        )
+        trace.trace_metadata = trace_metadata
+        figure.traces.append(trace)
+    return figure
+
+
+def _is_lazy_trace(trace: dict) -> bool:
+    y, x = trace.get('y'), trace.get('x')
+    return (
+        isinstance(y, h5py.Dataset)
+        and y.ndim == 1
+        and y.dtype.kind in 'biuf'
+        and trace.get('z') is None
+        and (x is None or (isinstance(x, h5py.Dataset) and x.shape == y.shape))
+    )
+
+
+def _downsample_lazy_trace(
+    trace: dict,
+    max_points: int,
+    method: DownsamplingMethod,
+    hdf5_path: str,
+    max_block_bytes: int,
+) -> None:
+    """
+    Downsample a trace whose data are h5py datasets while they are read block by
+    block. The statistics of the y values are recorded in the `meta` attribute.
+    """
+    x_dataset, y_dataset = trace.get('x'), trace['y']
+    n_points = len(y_dataset)
+    if n_points <= max_points or max_points < 4:
+        trace['y'] = y_dataset[()]
+        if x_dataset is not None:
+            trace['x'] = x_dataset[()]
+        return
+
+    def read_blocks():
+        for start, y_block in iter_blocks(y_dataset, max_block_bytes):
+            stop = start + len(y_block)
+            if x_dataset is None:
+                yield start, np.arange(start, stop), y_block
+            else:
+                yield start, x_dataset[start:stop], y_block
+
+    statistics = RunningStatistics()
+    _, x, y = downsample_blocks(
+        read_blocks, n_points, max_points, method, statistics.update
+    )
+    full_resolution = {'y': f'{hdf5_path}#{y_dataset.name}'}
+    if x_dataset is not None:
+        full_resolution['x'] = f'{hdf5_path}#{x_dataset.name}'
+        trace['x'] = x
+    trace['y'] = y
+    meta = trace.get('meta') if isinstance(trace.get('meta'), dict) else {}
+    trace['meta'] = {
+        **meta,
+        'downsampling': DownsamplingMethod(method).value,
+        'measured_points': n_points,
+        'full_resolution': dict(sorted(full_resolution.items())),
+        'statistics': statistics.as_dict(),
+    }
+
+
+def read_lazy_trace_data(figure_json: dict, max_points: int) -> None:
+    """
+    Replace the h5py datasets that are still the data of a trace by their values,
+    e.g. of heatmaps. With a positive `max_points` only every n-th value along
+    every axis is read, so that a trace has at most about `max_points` values.
+    """
+    for trace in figure_json.get('data', []):
+        datasets = [
+            trace[key]
+            for key in TRACE_DATA_KEYS
+            if isinstance(trace.get(key), h5py.Dataset)
+        ]
+        if not datasets:
+            continue
+        largest = max(datasets, key=lambda dataset: dataset.size)
+        step = strided_step(largest, max_points) if max_points > 0 else 1
+        for key in TRACE_DATA_KEYS:
+            values = trace.get(key)
+            if values is None or (step == 1 and not isinstance(values, h5py.Dataset)):
+                continue
+            if not isinstance(values, h5py.Dataset):
+                values = np.asarray(values)
+            trace[key] = values[(slice(None, None, step),) * values.ndim]
+
+
+def downsample_figure(
+    figure_json: dict,
+    max_points: int,
+    method: DownsamplingMethod,
+    hdf5_path: str,
+    max_block_bytes: int = MIN_BLOCK_BYTES,
+) -> dict:
+    """
+    Reduce every trace of the figure with more than `max_points` points to at most
+    `max_points` points.
+
+    The `meta` attribute of a reduced trace records the number of measured points
+    and links the full resolution data in the CAMELS file. Only trace data that
+    are h5py datasets are linked, they are read in blocks of `max_block_bytes`.
+
+    Args:
+        figure_json (dict): The Plotly JSON of the figure, changed in place.
+        max_points (int): The point budget of every trace, 0 disables downsampling.
+        method (DownsamplingMethod): The downsampling algorithm.
+        hdf5_path (str): The path of the CAMELS file inside the upload.
+        max_block_bytes (int, optional): The size of the blocks read at once.
+
+    Returns:
+        dict: The figure JSON.
+    """
+    if max_points <= 0:
+        return figure_json
+    for trace in figure_json.get('data', []):
+        if _is_lazy_trace(trace):
+            _downsample_lazy_trace(
+                trace, max_points, method, hdf5_path, max_block_bytes
+            )
+            continue
+        if trace.get('y') is None or trace.get('z') is not None:
+            continue
+        y = np.asarray(trace['y'])
+        if y.ndim != 1 or len(y) <= max_points or y.dtype.kind not in 'biuf':
+            continue
+        x = np.arange(len(y)) if trace.get('x') is None else np.asarray(trace['x'])
+        if x.shape != y.shape or x.dtype.kind not in 'biuf':
+            continue
+        indices = downsample(
+            x.astype(np.float64), y.astype(np.float64), max_points, method
+        )
+        # Calculated values, e.g. of formulas, have no dataset to link
+        full_resolution = {
+            key: f'{hdf5_path}#{trace[key].name}'
+            for key in ('x', 'y')
+            if isinstance(trace.get(key), h5py.Dataset)
+        }
+        if trace.get('x') is not None:
+            trace['x'] = x[indices]
+        trace['y'] = y[indices]
+        meta = trace.get('meta') if isinstance(trace.get('meta'), dict) else {}
+        trace['meta'] = {
+            **meta,
+            'downsampling': DownsamplingMethod(method).value,
+            'measured_points': len(y),
+            'full_resolution': full_resolution,
+        }
+    return figure_json
+
+
+def add_figure(
+    data,
+    figure_key: str,
+    figure_json: dict,
+    mode: FigureMode,
+    entry_group: h5py.Group,
+    hdf5_path: str,
+    max_points: int = 0,
+    downsampling: DownsamplingMethod = DownsamplingMethod.LTTB,
+    max_block_bytes: int = MIN_BLOCK_BYTES,
+) -> None:
+    """
+    Add a recreated plot to the measurement section `data` in the given `mode`.
+
+    Args:
+        data: The measurement section.
+        figure_key (str): The key of the figure returned by `recreate_plots`.
+        figure_json (dict): The Plotly JSON of the figure.
+        mode (FigureMode): How the figure is stored.
+        entry_group (h5py.Group): The CAMELS entry group of the file.
+        hdf5_path (str): The path of the CAMELS file inside the upload.
+        max_points (int, optional): The point budget of every inlined trace and
+            of the data of reference figures that are not in the CAMELS file, 0
+            disables downsampling.
+        downsampling (DownsamplingMethod, optional): The downsampling algorithm.
+        max_block_bytes (int, optional): The size of the blocks in which trace
+            data that are h5py datasets are read.
+    """
+    if FigureMode(mode) is FigureMode.REFERENCE:
+        data.figure_references.append(
+            reference_figure(
+                figure_key,
+                figure_json,
+                entry_group,
+                hdf5_path,
+                max_points,
+                downsampling,
+            )
+        )
+    else:
+        downsample_figure(
+            figure_json, max_points, downsampling, hdf5_path, max_block_bytes
+        )
+        read_lazy_trace_data(figure_json, max_points)
+        data.figures.append(PlotlyFigure(figure=figure_json))
@@ -0,0 +1,162 @@
+"""
+Shared, per-path h5py handles for the CAMELS parsers.
+
+Matching (``is_mainfile``) and parsing of one mainfile should not open the same
+HDF5 file over and over again. The functions in this module keep a small,
+bounded cache of read-only handles keyed by the absolute file path. A handle is
+reused as long as the file's modification time and size are unchanged.
+
+``hdf5_session`` pins a handle for the duration of a ``with`` block and closes it
+when the block is left, so that the handle of a processed entry is released
+deterministically.
+"""
+
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import h5py
+
+# Upper bound for the number of unpinned handles that are kept open. Matching
+# touches every HDF5 file of an upload, this keeps the number of open file
+# descriptors bounded.
+MAX_OPEN_HANDLES = 8
+
+
+class _Handle:
+    def __init__(self, file: 'h5py.File', stamp: tuple):
+        self.file = file
+        self.stamp = stamp
+        self.pins = 0
+
+    def close(self):
+        try:
+            if self.file.id.valid:
+                self.file.close()
+        except Exception:
+            pass
+
+
+_lock = threading.RLock()
+_handles: 'OrderedDict[str, _Handle]' = OrderedDict()
+
+
+def _stamp(path: str) -> tuple:
+    stat_result = os.stat(path)
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+def _evict():
+    """
+    Close the least recently used handles that are not pinned by a session.
+    """
+    unpinned = [key for key, handle in _handles.items() if handle.pins == 0]
+    while len(_handles) > MAX_OPEN_HANDLES and unpinned:
+        _handles.pop(unpinned.pop(0)).close()
+
+
+def get_hdf5_file(path: str) -> 'h5py.File':
+    """
+    Get an open, read-only h5py handle for the file at `path`.
+
+    An already open handle is reused if the file was not modified since it was
+    opened. The handle stays open until it is released with `release_hdf5_file`,
+    a surrounding `hdf5_session` ends or it is evicted from the cache.
+
+    Args:
+        path (str): The path to the HDF5 file.
+
+    Returns:
+        h5py.File: The shared file handle. Do not close it yourself.
+    """
+    key = os.path.abspath(path)
+    stamp = _stamp(key)
+    with _lock:
+        handle = _handles.get(key)
+        if handle is not None:
+            if handle.stamp == stamp and handle.file.id.valid:
+                _handles.move_to_end(key)
+                return handle.file
+            # The file changed on disk or the handle was closed from outside
+            if handle.pins == 0:
+                _handles.pop(key)
+                handle.close()
+            else:
+                return handle.file
+        # h5py is only loaded once a file has to be opened
+        import h5py
+
+        handle = _Handle(h5py.File(key, 'r'), stamp)
+        _handles[key] = handle
+        _evict()
+        return handle.file
+
+
+def release_hdf5_file(path: str) -> None:
+    """
+    Close the shared handle of `path` unless it is pinned by an active session.
+
+    Args:
+        path (str): The path to the HDF5 file.
+    """
+    key = os.path.abspath(path)
+    with _lock:
+        handle = _handles.get(key)
+        if handle is not None and handle.pins == 0:
+            _handles.pop(key)
+            handle.close()
+
+
+def release_all() -> None:
+    """
+    Close all shared handles, including pinned ones.
+    """
+    with _lock:
+        while _handles:
+            _, handle = _handles.popitem()
+            handle.close()
+
+
+def open_handle_count() -> int:
+    """
+    Returns the number of currently cached handles.
+    """
+    with _lock:
+        return len(_handles)
+
+
+@contextmanager
+def hdf5_session(path: str):
+    """
+    Context manager that provides the shared handle of `path` for a whole entry.
+
+    The handle is pinned while the block runs, so it cannot be evicted, and it is
+    closed when the outermost session of that path ends.
+
+    Args:
+        path (str): The path to the HDF5 file.
+
+    Yields:
+        h5py.File: The shared file handle.
+    """
+    key = os.path.abspath(path)
+    with _lock:
+        file = get_hdf5_file(key)
+        _handles[key].pins += 1
+    try:
+        yield file
+    finally:
+        with _lock:
+            handle = _handles.get(key)
+            if handle is not None:
+                handle.pins -= 1
+                if handle.pins == 0:
+                    _handles.pop(key)
+                    handle.close()
+
+
+atexit.register(release_all)
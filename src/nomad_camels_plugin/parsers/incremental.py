@@ -0,0 +1,119 @@
+"""
+Incremental reprocessing of CAMELS files.
+
+The fingerprint of a mainfile is its size, modification time and the SHA-256 of
+its content, together with the NOMAD and plugin versions and the parser options
+that change the archive. It is written next to the companion archive, like its
+digest. When an upload is reprocessed, a file whose fingerprint did not change
+is not parsed again. The content is only hashed if the size or the
+modification time changed, so unchanged files are skipped without reading them.
+"""
+
+import hashlib
+import json
+import os
+from functools import cache
+from typing import Optional
+
+from nomad.datamodel.context import ClientContext
+
+from .utils import fingerprint_filename
+
+HASH_BLOCK_BYTES = 2**20
+
+
+@cache
+def package_version(package: str) -> str:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version(package)
+    except PackageNotFoundError:
+        return 'unknown'
+
+
+def plugin_version() -> str:
+    return package_version('nomad-camels-plugin')
+
+
+def nomad_version() -> str:
+    # The archive follows the metainfo of the installed NOMAD
+    return package_version('nomad-lab')
+
+
+def content_hash(path: str) -> str:
+    """
+    The SHA-256 hex digest of the file at `path`, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_fingerprint(
+    path: str, parser_settings: dict, stored: Optional[dict] = None
+) -> dict:
+    """
+    The fingerprint of the mainfile at `path`.
+
+    Args:
+        path (str): The path of the mainfile.
+        parser_settings (dict): The name and the options of the parser that
+            change the archive.
+        stored (dict, optional): The previous fingerprint of the file. Its content
+            hash is reused if the size and the modification time are unchanged.
+
+    Returns:
+        dict: The JSON serializable fingerprint.
+    """
+    stat = os.stat(path)
+    if (
+        stored is not None
+        and stored.get('size') == stat.st_size
+        and stored.get('mtime_ns') == stat.st_mtime_ns
+    ):
+        content = stored.get('content_sha256')
+    else:
+        content = content_hash(path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'content_sha256': content,
+        'nomad_version': nomad_version(),
+        'plugin_version': plugin_version(),
+        'parser': parser_settings,
+    }
+
+
+def same_content(fingerprint: dict, stored: Optional[dict]) -> bool:
+    """
+    Whether the archive of a file with `fingerprint` is the one that was written
+    for `stored`. A copied or touched file only differs in its modification time.
+    """
+    if stored is None:
+        return False
+    ignored = {'mtime_ns'}
+    return {key: value for key, value in fingerprint.items() if key not in ignored} == {
+        key: value for key, value in stored.items() if key not in ignored
+    }
+
+
+def read_fingerprint(context, filename: str) -> Optional[dict]:
+    """
+    The fingerprint stored with the companion archive `filename`, `None` if the
+    archive or its fingerprint do not exist.
+    """
+    if context is None or isinstance(context, ClientContext):
+        return None
+    fingerprint_file = fingerprint_filename(filename)
+    if not (
+        context.raw_path_exists(filename) and context.raw_path_exists(fingerprint_file)
+    ):
+        return None
+    try:
+        with context.raw_file(fingerprint_file, 'r') as file:
+            return json.load(file)
+    except ValueError:
+        return None
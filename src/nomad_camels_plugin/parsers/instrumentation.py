@@ -0,0 +1,279 @@
+"""
+Timing and profiling of the parsing of CAMELS entries.
+
+Every stage of a parse is timed and the bytes the process read and wrote while it
+ran are counted. The measurements are logged through the logger passed to
+`parse`, per stage at debug level and as a summary of the entry, including the
+peak resident memory, at info level.
+Optionally, a profile of every entry is written with cProfile or pyinstrument.
+"""
+
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from enum import Enum
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from structlog.stdlib import (
+        BoundLogger,
+    )
+
+# Cumulative I/O of the process, only available on Linux
+PROC_IO_PATH = '/proc/self/io'
+PROC_STATUS_PATH = '/proc/self/status'
+RSS_SAMPLE_SECONDS = 0.01
+
+
+class Profiler(str, Enum):
+    """
+    The profilers that can record a profile of every parsed entry.
+    """
+
+    CPROFILE = 'cprofile'
+    PYINSTRUMENT = 'pyinstrument'
+
+
+class StageTiming(NamedTuple):
+    """
+    The measurements of one stage of a parse.
+
+    Attributes:
+        stage: Name of the stage.
+        seconds: Wall time of the stage.
+        bytes_read: Bytes read by the process during the stage, `None` if the
+            platform does not count them.
+        bytes_written: Bytes written by the process during the stage.
+    """
+
+    stage: str
+    seconds: float
+    bytes_read: Optional[int]
+    bytes_written: Optional[int]
+
+
+def io_counters() -> tuple[Optional[int], Optional[int]]:
+    """
+    The numbers of bytes the process has read and written so far, including
+    reads served from the page cache.
+    """
+    try:
+        with open(PROC_IO_PATH) as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+    except (OSError, ValueError):
+        return None, None
+    return int(counters['rchar']), int(counters['wchar'])
+
+
+def _status_bytes(field: str) -> Optional[int]:
+    try:
+        with open(PROC_STATUS_PATH) as f:
+            for line in f:
+                if line.startswith(f'{field}:'):
+                    # The values are given in kB
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def rss() -> Optional[int]:
+    """
+    The resident memory of the process in bytes, `None` if unknown.
+    """
+    return _status_bytes('VmRSS')
+
+
+def peak_rss() -> Optional[int]:
+    """
+    The peak resident memory of the process in bytes since it started, `None` if
+    unknown.
+    """
+    peak = _status_bytes('VmHWM')
+    if peak is not None:
+        return peak
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kB, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RssSampler:
+    """
+    Samples the resident memory of the process in a background thread while the
+    `with` block runs. The state of the process, e.g. its peak resident memory,
+    is not changed. Allocations that are freed again within one interval can be
+    missed, so the peak is a lower bound. The reads of the samples are counted
+    in the `bytes_read` of the stages, so only enable it if the memory matters.
+
+    Attributes:
+        start: The resident memory in bytes when the block started, `None` if
+            unknown.
+        peak: The highest sampled resident memory in bytes, `None` if unknown.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS, enabled: bool = True):
+        self.interval = interval
+        self.enabled = enabled
+        self.start: Optional[int] = None
+        self.peak: Optional[int] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> Optional[int]:
+        value = rss()
+        if value is not None and (self.peak is None or value > self.peak):
+            self.peak = value
+        return value
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> 'RssSampler':
+        if not self.enabled:
+            return self
+        self.start = self._sample()
+        # Without /proc/self/status there is nothing to sample
+        if self.start is not None:
+            self._thread = threading.Thread(
+                target=self._run, name='camels-rss-sampler', daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._sample()
+
+
+def is_enabled(logger, level: int) -> bool:
+    # structlog loggers without level filtering log everything
+    is_enabled_for = getattr(logger, 'isEnabledFor', None)
+    return is_enabled_for is None or is_enabled_for(level)
+
+
+def log_with_fields(logger, level: int, event: str, **fields) -> None:
+    """
+    Logs `event` with structured `fields`. Standard library loggers get the
+    fields as `extra` and appended to the message.
+    """
+    if not is_enabled(logger, level):
+        return
+    method = getattr(logger, logging.getLevelName(level).lower())
+    if isinstance(logger, (logging.Logger, logging.LoggerAdapter)):
+        details = ', '.join(f'{key}={value}' for key, value in fields.items())
+        method(f'{event} ({details})', extra=fields)
+    else:
+        method(event, **fields)
+
+
+@contextmanager
+def timed_stage(logger: 'BoundLogger', stage: str, timings: list):
+    """
+    Times the code in the `with` block as `stage`, appends the `StageTiming` to
+    `timings` and logs it at debug level.
+    """
+    read_before, written_before = io_counters()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        read_after, written_after = io_counters()
+        timing = StageTiming(
+            stage,
+            seconds,
+            None if read_before is None else read_after - read_before,
+            None if written_before is None else written_after - written_before,
+        )
+        timings.append(timing)
+        log_with_fields(
+            logger,
+            logging.DEBUG,
+            'CAMELS parser stage finished',
+            stage=stage,
+            duration=round(seconds, 6),
+            bytes_read=timing.bytes_read,
+            bytes_written=timing.bytes_written,
+        )
+
+
+def log_timings(
+    logger: 'BoundLogger',
+    mainfile: str,
+    timings: list,
+    peak_rss_bytes: Optional[int] = None,
+) -> None:
+    """
+    Logs the summary of all stages of the entry `mainfile` at info level.
+    """
+    log_with_fields(
+        logger,
+        logging.INFO,
+        'CAMELS entry parsed',
+        mainfile=mainfile,
+        duration=round(sum(timing.seconds for timing in timings), 6),
+        stage_durations={timing.stage: round(timing.seconds, 6) for timing in timings},
+        bytes_read=sum(timing.bytes_read or 0 for timing in timings),
+        bytes_written=sum(timing.bytes_written or 0 for timing in timings),
+        peak_rss_bytes=peak_rss_bytes,
+    )
+
+
+@contextmanager
+def profile_entry(
+    profiler: Optional[str],
+    profile_dir: Optional[str],
+    name: str,
+    logger: 'BoundLogger',
+):
+    """
+    Profiles the code in the `with` block if a `profiler` is set and writes the
+    profile of the entry `name` into `profile_dir`. cProfile writes `.prof`
+    files, pyinstrument `.html` files.
+    """
+    if not profiler:
+        yield
+        return
+    profiler = Profiler(profiler)
+    profile_dir = profile_dir or os.path.join(os.getcwd(), 'camels_profiles')
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, re.sub(r'[^\w.-]', '_', name))
+    if profiler is Profiler.PYINSTRUMENT:
+        try:
+            from pyinstrument import Profiler as PyinstrumentProfiler
+        except ImportError:
+            logger.warning('pyinstrument is not installed, the entry is not profiled')
+            yield
+            return
+        session = PyinstrumentProfiler()
+        session.start()
+        try:
+            yield
+        finally:
+            session.stop()
+            path = f'{path}.html'
+            with open(path, 'w') as f:
+                f.write(session.output_html())
+    else:
+        import cProfile
+
+        session = cProfile.Profile()
+        session.enable()
+        try:
+            yield
+        finally:
+            session.disable()
+            path = f'{path}.prof'
+            session.dump_stats(path)
+    log_with_fields(logger, logging.INFO, 'CAMELS entry profiled', profile=path)
@@ -0,0 +1,133 @@
+"""
+Helpers used by the CAMELS parsers to decide whether a file is a CAMELS file.
+"""
+
+import os
+from enum import Enum
+from functools import lru_cache
+from typing import Optional
+
+from nomad import utils
+
+from .hdf5_session import get_hdf5_file, release_hdf5_file
+
+# The eight byte signature every HDF5 file starts with. If the file has a user
+# block, the signature is found at offset 512, 1024, 2048, ...
+HDF5_SIGNATURE = b'\x89HDF\r\n\x1a\n'
+
+# Byte patterns that CAMELS writes when the file is created. The `file_type`
+# attribute value is stored in the root group's object header and the name of
+# the `CAMELS_<session>` entry in the root group's heap, both of which are
+# located at the beginning of the file.
+CAMELS_MARKERS = (b'NOMAD CAMELS', b'CAMELS_')
+
+logger = utils.get_logger(__name__)
+
+
+def _has_hdf5_signature(buffer: bytes) -> bool:
+    offset = 0
+    while offset + len(HDF5_SIGNATURE) <= len(buffer):
+        if buffer[offset : offset + len(HDF5_SIGNATURE)] == HDF5_SIGNATURE:
+            return True
+        offset = 512 if offset == 0 else offset * 2
+    return False
+
+
+def prefilter_buffer(buffer: bytes) -> Optional[bool]:
+    """
+    Cheap pre-classification of a potential CAMELS file based on its header bytes.
+
+    This works on the buffer NOMAD reads for matching anyway and never opens the
+    file with h5py.
+
+    Args:
+        buffer (bytes): The first bytes of the file.
+
+    Returns:
+        Optional[bool]: `False` if the file is clearly not a CAMELS file (no HDF5
+        signature or no CAMELS marker), `True` if it is a candidate that has to be
+        checked with h5py and `None` if no buffer was given and nothing can be
+        decided.
+    """
+    if not buffer:
+        return None
+    if not _has_hdf5_signature(buffer):
+        return False
+    return any(marker in buffer for marker in CAMELS_MARKERS)
+
+
+class CamelsFileKind(Enum):
+    """
+    The verdict of `classify_camels_file`. Every CAMELS parser handles exactly one
+    kind of file.
+    """
+
+    GENERIC = 'generic CAMELS'
+    DIODE_DEMO = 'diode demo'
+    FOREIGN = 'foreign'
+
+
+def classify_camels_file(filename: str, buffer: bytes = b'') -> CamelsFileKind:
+    """
+    Classify the file at `filename` as generic CAMELS file, diode demo
+    measurement or foreign file.
+
+    The result is cached per path, modification time and size, so all CAMELS
+    parsers can consult this function and the file is only inspected once.
+
+    Args:
+        filename (str): The path to the file.
+        buffer (bytes, optional): The first bytes of the file, used to reject
+            foreign files without opening them.
+
+    Returns:
+        CamelsFileKind: The kind of the file.
+    """
+    if prefilter_buffer(buffer) is False:
+        return CamelsFileKind.FOREIGN
+    path = os.path.abspath(filename)
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return CamelsFileKind.FOREIGN
+    return _classify(path, stat_result.st_mtime_ns, stat_result.st_size)
+
+
+@lru_cache(maxsize=1024)
+def _classify(path: str, mtime_ns: int, size: int) -> CamelsFileKind:
+    # mtime_ns and size are only part of the cache key
+    try:
+        kind = _classify_hdf5_file(get_hdf5_file(path))
+    except Exception as e:
+        logger.warning('Error while checking the CAMELS file type', exc_info=e)
+        kind = CamelsFileKind.FOREIGN
+    if kind is CamelsFileKind.FOREIGN:
+        # No parser will process this file, so there is no need to keep it open
+        release_hdf5_file(path)
+    return kind
+
+
+def _classify_hdf5_file(f) -> CamelsFileKind:
+    # The attribute might be bytes, so decode if necessary
+    file_type_value = f.attrs.get('file_type')
+    if isinstance(file_type_value, bytes):
+        file_type_value = file_type_value.decode('utf-8')
+    if file_type_value is None:
+        logger.debug('No file_type attribute found in the file')
+        # Check to see if the file is a legacy CAMELS file
+        # Check if CAMELS_ is in any of the top level keys of the HDF5 file
+        if any('CAMELS_' in key for key in f.keys()):
+            logger.debug('File is an older NOMAD CAMELS file')
+            return CamelsFileKind.GENERIC
+        logger.debug('File is not a NOMAD CAMELS file')
+        return CamelsFileKind.FOREIGN
+    if file_type_value != 'NOMAD CAMELS':
+        logger.debug('File type is not NOMAD CAMELS', file_type=file_type_value)
+        return CamelsFileKind.FOREIGN
+    camels_key = next(key for key in f.keys() if 'CAMELS_' in key)
+    tags = f[f'{camels_key}/measurement_details/measurement_tags'][:]
+    if b'diode' in tags and b'demo' in tags:
+        logger.debug('File is a diode demo measurement with its own entry')
+        return CamelsFileKind.DIODE_DEMO
+    logger.debug('File is a NOMAD CAMELS file')
+    return CamelsFileKind.GENERIC
@@ -0,0 +1,197 @@
+"""
+The staged extraction of a CAMELS entry into a measurement section.
+
+All CAMELS parsers run the same stages on the open file: the measurement
+metadata, the sample, the instruments, the catalog and the statistics of the
+recorded channels, the user and the figures. Specialised measurement types add
+analysis stages that work on what the earlier stages extracted instead of reading
+the file again. The figures are added to the section after the analysis, so that
+analysis stages can add traces, e.g. fits.
+
+The plotted datasets are not read by the figures stage. They are read in blocks
+when the figures are stored, or only linked by reference figures. With a memory
+limit, only their downsampled previews and statistics are kept and large
+settings are summarised.
+"""
+
+from collections.abc import Callable, Sequence
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+from .chunked import block_bytes
+from .extraction import (
+    read_channel_catalog,
+    read_channel_statistics,
+    read_instruments,
+    read_measurement_details,
+    read_sample,
+)
+from .figures import add_figure
+from .instrumentation import timed_stage
+from .plots import recreate_figures
+from .users import get_user_resolver, read_user, runs_in_nomad_worker
+
+# The point budget of the traces if downsampling is disabled but memory bounded
+BOUNDED_MAX_POINTS = 10000
+
+if TYPE_CHECKING:
+    import h5py
+    from nomad.datamodel.datamodel import (
+        EntryArchive,
+    )
+    from structlog.stdlib import (
+        BoundLogger,
+    )
+
+
+class ParseContext:
+    """
+    The state that the stages of one parse share.
+
+    Attributes:
+        mainfile: The path of the CAMELS file.
+        archive: The archive of the mainfile.
+        logger: A structlog logger.
+        entry_group: The CAMELS entry of the open file.
+        data: The measurement section that is filled.
+        path_in_filesystem: The path of the file in the raw directory of the upload.
+        figures: The Plotly figure dicts by name, set by the figures stage.
+        memory_limit: The memory in bytes the parse should stay below, 0 if it
+            is unbounded.
+        block_bytes: The size of the blocks in which datasets are read.
+        figure_options: Keyword arguments of `add_figure` that set how the
+            figures are stored.
+        timings: The `StageTiming` of every stage that ran.
+    """
+
+    def __init__(
+        self,
+        mainfile: str,
+        archive: 'EntryArchive',
+        logger: 'BoundLogger',
+        entry_group: 'h5py.Group',
+        data,
+        memory_limit: int = 0,
+        **figure_options,
+    ):
+        self.mainfile = mainfile
+        self.archive = archive
+        self.logger = logger
+        self.entry_group = entry_group
+        self.data = data
+        # The mainfile path in the upload, from the raw directory path otherwise
+        metadata = getattr(archive, 'metadata', None)
+        if metadata is not None and metadata.mainfile:
+            self.path_in_filesystem = metadata.mainfile
+        else:
+            self.path_in_filesystem = mainfile.split('/raw/')[1]
+        self.figures: Optional[dict[str, dict]] = None
+        self.memory_limit = memory_limit
+        self.block_bytes = block_bytes(memory_limit)
+        if memory_limit:
+            # Without a point budget the figures would hold all measured values
+            if figure_options.get('max_points', 0) <= 0:
+                figure_options['max_points'] = BOUNDED_MAX_POINTS
+            figure_options['max_block_bytes'] = self.block_bytes
+        self.figure_options = figure_options
+        self.timings = []
+
+
+class Stage(NamedTuple):
+    """
+    A step of the extraction.
+
+    Attributes:
+        name: Name of the stage.
+        run: Called with the `ParseContext` of the parse.
+    """
+
+    name: str
+    run: Callable[[ParseContext], None]
+
+
+def extract_metadata(context: ParseContext) -> None:
+    read_measurement_details(context.entry_group, context.data, context.logger)
+    # Add the CAMELS data file to the entry
+    context.data.camels_file = context.path_in_filesystem
+
+
+def extract_sample(context: ParseContext) -> None:
+    read_sample(context.entry_group, context.data, context.logger)
+
+
+def extract_instruments(context: ParseContext) -> None:
+    # Reference all the instruments and get their settings in a single walk
+    instrument_references, settings_dict = read_instruments(
+        context.entry_group, context.figure_options.get('max_block_bytes')
+    )
+    context.data.instruments.extend(instrument_references)
+    # The settings are already decoded into JSON serializable values
+    context.data.camels_instrument_settings = settings_dict
+
+
+def extract_channel_catalog(context: ParseContext) -> None:
+    # Only the metadata of the datasets is read
+    read_channel_catalog(context.entry_group, context.data)
+
+
+def extract_channel_statistics(context: ParseContext) -> None:
+    read_channel_statistics(context.entry_group, context.data, context.block_bytes)
+
+
+def extract_user(context: ParseContext) -> None:
+    # Inside a NOMAD worker the user is resolved without an HTTP round trip
+    context.data.camels_user = read_user(
+        context.entry_group,
+        context.logger,
+        get_user_resolver(in_process=runs_in_nomad_worker(context.archive)),
+    )
+
+
+def extract_figures(context: ParseContext) -> None:
+    context.logger.debug(f'Path in filesystem: {context.path_in_filesystem}')
+    context.data.hdf5_file = (
+        f'{context.path_in_filesystem}#/{context.entry_group.name.lstrip("/")}/data'
+    )
+    # The figures are built from the open file, only plots that cannot be built
+    # natively are recreated by the toolbox. The traces keep their datasets, so
+    # that the stored figures can link them and read them in blocks.
+    context.figures = recreate_figures(context.entry_group, context.mainfile, lazy=True)
+
+
+def store_figures(context: ParseContext) -> None:
+    for figure_key, figure in context.figures.items():
+        add_figure(
+            context.data,
+            figure_key,
+            figure,
+            entry_group=context.entry_group,
+            hdf5_path=context.path_in_filesystem,
+            **context.figure_options,
+        )
+
+
+EXTRACTION_STAGES = (
+    Stage('metadata', extract_metadata),
+    Stage('samples', extract_sample),
+    Stage('instruments', extract_instruments),
+    Stage('channel catalog', extract_channel_catalog),
+    Stage('channel statistics', extract_channel_statistics),
+    Stage('user', extract_user),
+    Stage('figures', extract_figures),
+)
+STORE_FIGURES_STAGE = Stage('store figures', store_figures)
+
+
+def run_stages(context: ParseContext, analysis_stages: Sequence[Stage] = ()) -> None:
+    """
+    Runs the extraction stages, the analysis stages and stores the figures. Every
+    stage is timed, see `timed_stage`.
+
+    Args:
+        context (ParseContext): The state of the parse.
+        analysis_stages (Sequence[Stage], optional): The stages of a specialised
+            measurement type, run once the figures are built.
+    """
+    for stage in (*EXTRACTION_STAGES, *analysis_stages, STORE_FIGURES_STAGE):
+        with timed_stage(context.logger, stage.name, context.timings):
+            stage.run(context)
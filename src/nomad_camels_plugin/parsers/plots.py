@@ -0,0 +1,435 @@
+"""
+Reconstruction of the plots of a CAMELS file as Plotly figure dicts.
+
+The figures are built directly from the datasets of the already open file, without
+the Plotly object model. They look the same as the ones of
+`nomad_camels_toolbox.recreate_plots`, which is only used for plots that cannot be
+built natively.
+"""
+
+import ast
+import importlib.util
+import json
+import re
+from functools import cache
+from pathlib import Path
+from typing import Optional
+
+import h5py
+import numpy as np
+
+# CAMELS files written with an older suitcase only contain the plot definitions in
+# the protocol, newer ones contain a `plot_*` group for every plot
+FIRST_PLOT_GROUP_SUITCASE_VERSION = (1, 0, 0)
+SUITCASE_VERSION_DATASET = 'program/python_environment/suitcase-nomad-camels-hdf5'
+
+VIRIDIS = [
+    [0.0, '#440154'],
+    [0.1111111111111111, '#482878'],
+    [0.2222222222222222, '#3e4989'],
+    [0.3333333333333333, '#31688e'],
+    [0.4444444444444444, '#26828e'],
+    [0.5555555555555556, '#1f9e89'],
+    [0.6666666666666666, '#35b779'],
+    [0.7777777777777778, '#6ece58'],
+    [0.8888888888888888, '#b5de2b'],
+    [1.0, '#fde725'],
+]
+
+
+class UnsupportedPlotError(Exception):
+    """
+    Raised if a plot of the CAMELS file cannot be built natively, e.g. because it
+    contains a fit.
+    """
+
+
+@cache
+def plotly_template() -> Optional[dict]:
+    """
+    The default Plotly template, read from the Plotly package data without
+    importing Plotly. `None` if Plotly is not installed.
+    """
+    spec = importlib.util.find_spec('plotly')
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    template_file = (
+        Path(spec.submodule_search_locations[0])
+        / 'package_data'
+        / 'templates'
+        / 'plotly.json'
+    )
+    try:
+        with open(template_file, encoding='utf-8') as f:
+            return json.load(f)
+    except OSError:
+        return None
+
+
+def _new_layout(secondary_y: bool = False) -> dict:
+    layout = {
+        'xaxis': {'anchor': 'y', 'domain': [0.0, 0.94 if secondary_y else 1.0]},
+        'yaxis': {'anchor': 'x', 'domain': [0.0, 1.0]},
+    }
+    if secondary_y:
+        layout['yaxis2'] = {'anchor': 'x', 'overlaying': 'y', 'side': 'right'}
+    return layout
+
+
+def _new_figure(layout: dict) -> dict:
+    template = plotly_template()
+    if template is not None:
+        layout = {'template': template, **layout}
+    return {'data': [], 'layout': layout}
+
+
+def _scatter(x, y, name: str, secondary_y: bool = False, **kwargs) -> dict:
+    return {
+        'mode': 'markers',
+        'name': name,
+        'x': x,
+        'y': y,
+        'type': 'scatter',
+        'xaxis': 'x',
+        'yaxis': 'y2' if secondary_y else 'y',
+        **kwargs,
+    }
+
+
+def _decode(value) -> str:
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return str(value)
+
+
+def _wrap_recursive(node: ast.expr, source: str) -> str:
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)):
+        operator = '+' if isinstance(node.op, ast.Add) else '-'
+        left = _wrap_recursive(node.left, source)
+        right = _wrap_recursive(node.right, source)
+        return f'{left}<br> {operator} {right}'
+    return ast.get_source_segment(source, node)
+
+
+def wrap_arithmetic_string(source: str) -> str:
+    """
+    Break long formulas before their `+` and `-` operators with `<br>`, like the
+    trace names of the CAMELS toolbox.
+    """
+    if len(source) < 20:
+        return source
+    try:
+        return _wrap_recursive(ast.parse(source, mode='eval').body, source)
+    except Exception:
+        return source
+
+
+def suitcase_version(entry_group: h5py.Group) -> tuple[int, ...]:
+    """
+    The version of the suitcase that wrote the CAMELS entry, `(0,)` if unknown.
+    """
+    dataset = entry_group.get(SUITCASE_VERSION_DATASET)
+    if dataset is None:
+        return (0,)
+    return tuple(int(part) for part in re.findall(r'\d+', _decode(dataset[()]))[:3])
+
+
+def build_figures(entry_group: h5py.Group, lazy: bool = False) -> dict[str, dict]:
+    """
+    Build the figures of all plots of the CAMELS entry.
+
+    Args:
+        entry_group (h5py.Group): The CAMELS entry group of the file.
+        lazy (bool, optional): Keep the h5py datasets instead of their values as
+            trace data, so that they can be read in chunks later. Formulas of
+            the plots of older files are still evaluated in memory.
+
+    Returns:
+        dict[str, dict]: The Plotly figure dicts keyed like the figures of
+        `recreate_plots`. The trace data are NumPy arrays.
+
+    Raises:
+        UnsupportedPlotError: If a plot cannot be built natively.
+    """
+    if suitcase_version(entry_group) < FIRST_PLOT_GROUP_SUITCASE_VERSION:
+        return build_protocol_figures(entry_group, lazy)
+    return build_plot_group_figures(entry_group, lazy)
+
+
+# Plots of files written by suitcase >= 1.0.0
+
+
+def find_plot_groups(entry_group: h5py.Group) -> list[h5py.Group]:
+    """
+    All `plot_*` NXdata groups of the entry, ordered by their number.
+    """
+    plot_groups = []
+
+    def visit(name, obj):
+        if (
+            name.rsplit('/', 1)[-1].startswith('plot_')
+            and isinstance(obj, h5py.Group)
+            and _decode(obj.attrs.get('NX_class', '')) == 'NXdata'
+        ):
+            plot_groups.append(obj)
+
+    entry_group.visititems(visit)
+    plot_groups.sort(key=lambda group: int(group.name.split('plot_')[-1].split('/')[0]))
+    return plot_groups
+
+
+def build_plot_group_figure(plot_group: h5py.Group, lazy: bool = False) -> dict:
+    """
+    Build the figure of a `plot_*` group of the CAMELS entry. If `lazy`, the
+    trace data are the h5py datasets.
+    """
+
+    def values(dataset: h5py.Dataset):
+        return dataset if lazy else dataset[()]
+
+    if 'fit' in plot_group:
+        raise UnsupportedPlotError(f'{plot_group.name} contains a fit')
+    if '_plot_data_axes' in plot_group:
+        secondary = any(
+            item.attrs.get('y_axes_index') == 2 for item in plot_group.values()
+        )
+        layout = _new_layout(secondary)
+        axis = plot_group['_plot_data_axes']
+        layout['xaxis']['title'] = {'text': _decode(axis.attrs['long_name'])}
+        layout['title'] = {'text': f'Plot from {plot_group.name}'}
+        layout['showlegend'] = True
+        figure = _new_figure(layout)
+        x_data = values(axis)
+        for name, item in plot_group.items():
+            if '_plot_data_signal' not in name:
+                continue
+            long_name = _decode(item.attrs['long_name'])
+            on_secondary = item.attrs['y_axes_index'] != 1
+            figure['data'].append(
+                _scatter(
+                    x_data,
+                    values(item),
+                    wrap_arithmetic_string(long_name),
+                    on_secondary,
+                )
+            )
+            if item.attrs['y_axes_index'] in (1, 2):
+                layout['yaxis2' if on_secondary else 'yaxis']['title'] = {
+                    'text': long_name
+                }
+    elif '_plot_data_axes_0' in plot_group:
+        signal = plot_group['_plot_data_signal']
+        layout = {
+            'title': {'text': f'2D Plot from {plot_group.name}'},
+            'xaxis': {
+                'title': {
+                    'text': _decode(plot_group['_plot_data_axes_0'].attrs['long_name'])
+                }
+            },
+            'yaxis': {
+                'title': {
+                    'text': _decode(plot_group['_plot_data_axes_1'].attrs['long_name'])
+                }
+            },
+        }
+        figure = _new_figure(layout)
+        figure['data'].append(
+            {
+                'colorbar': {'title': {'text': _decode(signal.attrs['long_name'])}},
+                'colorscale': VIRIDIS,
+                'showscale': True,
+                'x': values(plot_group['_plot_data_axes_0']),
+                'y': values(plot_group['_plot_data_axes_1']),
+                'z': values(signal),
+                'type': 'heatmap',
+            }
+        )
+    else:
+        raise UnsupportedPlotError(f'{plot_group.name} has no plot axes')
+    # Small fonts, as the labels can be long
+    figure['layout']['font'] = {'size': 9}
+    figure['layout'].setdefault('title', {})['font'] = {'size': 9}
+    return figure
+
+
+def build_plot_group_figures(
+    entry_group: h5py.Group, lazy: bool = False
+) -> dict[str, dict]:
+    return {
+        plot_group.name: build_plot_group_figure(plot_group, lazy)
+        for plot_group in find_plot_groups(entry_group)
+    }
+
+
+# Plots of files written by suitcase < 1.0.0
+
+
+def plots_from_protocol(own_name: str, protocol_info: dict) -> dict[str, list]:
+    """
+    Collect the plot definitions of the protocol and its sub protocols, keyed by
+    the name of the stream they show.
+    """
+    plot_info = {}
+    if protocol_info['plots']:
+        plot_info[own_name] = protocol_info['plots']
+    for step_info in protocol_info['loop_step_dict'].values():
+        name = (
+            f'{own_name}/{step_info["name"]}'
+            if own_name != 'primary'
+            else step_info['name']
+        )
+        if 'plots' in step_info:
+            plot_info[name] = step_info['plots']
+        elif '_sub_protocol_dict' in step_info:
+            plot_info.update(plots_from_protocol(name, step_info['_sub_protocol_dict']))
+    return plot_info
+
+
+class StreamData:
+    """
+    Lazy access to the channels and variables of a stream of the CAMELS entry.
+    Every dataset is read at most once.
+    """
+
+    def __init__(self, group: h5py.Group):
+        self.group = group
+        self._values = {}
+
+    def _dataset(self, name: str) -> Optional[h5py.Dataset]:
+        dataset = self.group.get(name)
+        if isinstance(dataset, h5py.Dataset):
+            return dataset
+        # The variables are stored in the `*_variable_signal` groups
+        for key, item in self.group.items():
+            if key.endswith('_variable_signal') and isinstance(
+                item.get(name), h5py.Dataset
+            ):
+                return item[name]
+        return None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._values or self._dataset(name) is not None
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._values:
+            dataset = self._dataset(name)
+            if dataset is None:
+                raise KeyError(name)
+            self._values[name] = dataset[()]
+        return self._values[name]
+
+    def evaluate(self, formula: str, lazy: bool = False):
+        """
+        Get the values of a channel or evaluate a formula of channels. If `lazy`,
+        a channel that was not read yet is returned as its h5py dataset.
+        """
+        formula = formula.strip()
+        if lazy and formula not in self._values:
+            dataset = self._dataset(formula)
+            if dataset is not None:
+                return dataset
+        if formula in self:
+            return self[formula]
+        namespace = {'np': np, 'numpy': np, 'time': 0}
+        namespace.update({name: getattr(np, name) for name in np.__all__})
+        if 'const' in formula:
+            import scipy.constants
+
+            namespace['const'] = scipy.constants
+        code = compile(formula, '<plot formula>', 'eval')
+        for name in code.co_names:
+            if name not in namespace and name in self:
+                namespace[name] = self[name]
+        return eval(code, {'__builtins__': {}}, namespace)
+
+
+def build_xy_figure(plot: dict, stream: StreamData, lazy: bool = False) -> dict:
+    """
+    Build the figure of an X-Y plot defined in the protocol. If `lazy`, the
+    trace data of channels are the h5py datasets.
+    """
+    if (plot['same_fit'] and plot['all_fit']['do_fit']) or any(
+        fit['do_fit'] for fit in plot['fits']
+    ):
+        raise UnsupportedPlotError(f'The plot {plot["name"]} contains a fit')
+    y_names = plot['y_axes']['formula']
+    y_axes = plot['y_axes']['axis']
+    x_name = plot['x_axis']
+    secondary = 'right' in y_axes
+    layout = _new_layout(secondary)
+    if secondary:
+        layout['yaxis2']['title'] = {
+            'text': plot['ylabel2'] or y_names[y_axes.index('right')]
+        }
+    layout['title'] = {'text': plot['name']}
+    layout['xaxis']['title'] = {'text': plot['xlabel'] or x_name}
+    layout['yaxis']['title'] = {'text': plot['ylabel'] or y_names[0]}
+    layout['legend'] = {
+        'orientation': 'h',
+        'yanchor': 'bottom',
+        'y': 1.02,
+        'xanchor': 'right',
+        'x': 1,
+    }
+    layout['margin'] = {'l': 40, 'r': 40, 't': 40, 'b': 40}
+    figure = _new_figure(layout)
+    x_data = stream.evaluate(x_name, lazy)
+    for y_name, y_axis in zip(y_names, y_axes):
+        figure['data'].append(
+            _scatter(x_data, stream.evaluate(y_name, lazy), y_name, y_axis == 'right')
+        )
+    return figure
+
+
+def build_protocol_figures(
+    entry_group: h5py.Group, lazy: bool = False
+) -> dict[str, dict]:
+    """
+    Build the figures of all plots defined in the protocol of the CAMELS entry.
+    If `lazy`, the trace data of channels are the h5py datasets.
+    """
+    protocol_json = entry_group['measurement_details/protocol_json'][()]
+    plot_info = plots_from_protocol('primary', json.loads(_decode(protocol_json)))
+    data_group = entry_group['data']
+    figures = {}
+    for stream_name, plots in plot_info.items():
+        if stream_name == 'primary':
+            stream_group = data_group
+        else:
+            stream_group = data_group.get(stream_name)
+            if not isinstance(stream_group, h5py.Group):
+                continue
+        stream = StreamData(stream_group)
+        for plot in plots:
+            if plot['plt_type'] != 'X-Y plot':
+                raise UnsupportedPlotError(
+                    f'The plot {plot["name"]} is a {plot["plt_type"]}'
+                )
+            figures[f'{stream_name}: {plot["name"]}'] = build_xy_figure(
+                plot, stream, lazy
+            )
+    return figures
+
+
+def recreate_figures(
+    entry_group: h5py.Group, mainfile: str, lazy: bool = False
+) -> dict[str, dict]:
+    """
+    Get the figures of all plots of the CAMELS entry. They are built natively if
+    possible, otherwise with `nomad_camels_toolbox.recreate_plots`.
+
+    Args:
+        entry_group (h5py.Group): The CAMELS entry group of the file.
+        mainfile (str): The path of the CAMELS file.
+        lazy (bool, optional): See `build_figures`.
+
+    Returns:
+        dict[str, dict]: The Plotly figure dicts keyed by the plot names.
+    """
+    try:
+        return build_figures(entry_group, lazy)
+    except UnsupportedPlotError:
+        import nomad_camels_toolbox as nct
+
+        plots = nct.recreate_plots(mainfile, show_figures=False) or {}
+        return {key: plot.to_plotly_json() for key, plot in plots.items()}
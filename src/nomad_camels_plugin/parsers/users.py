@@ -0,0 +1,254 @@
+"""
+Resolution of the NOMAD user stored in a CAMELS file to the user's full name.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import h5py
+    from structlog.stdlib import (
+        BoundLogger,
+    )
+
+# Seconds to wait for the NOMAD API before falling back to the user name in the file
+DEFAULT_TIMEOUT = 2.0
+# Seconds a resolved (or not existing) user is cached
+DEFAULT_TTL = 3600.0
+# Seconds a failed lookup is cached, so an unreachable API is not asked for every entry
+DEFAULT_ERROR_TTL = 60.0
+DEFAULT_MAXSIZE = 1024
+
+
+class UserLookupError(Exception):
+    """
+    Raised if the NOMAD API could not be asked for a user.
+    """
+
+
+class UserResolver:
+    """
+    Resolves NOMAD user ids to full names through the `/v1/users` endpoint of the
+    NOMAD API.
+
+    Results are kept in a TTL/LRU cache keyed by the user id. Users that do not
+    exist are cached as well. All requests share one pooled HTTP session and are
+    bounded by a strict timeout.
+
+    Args:
+        api_url (str, optional): Base URL of the NOMAD API. Defaults to
+            `config.api_url()`.
+        timeout (float, optional): Timeout of a single request in seconds.
+        ttl (float, optional): Seconds a lookup result is cached.
+        error_ttl (float, optional): Seconds a failed lookup is cached.
+        maxsize (int, optional): Maximum number of cached user ids.
+    """
+
+    def __init__(
+        self,
+        api_url: Optional[str] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        ttl: float = DEFAULT_TTL,
+        error_ttl: float = DEFAULT_ERROR_TTL,
+        maxsize: int = DEFAULT_MAXSIZE,
+    ):
+        self._api_url = api_url
+        self.timeout = timeout
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.maxsize = maxsize
+        self._cache: OrderedDict[str, tuple[float, Optional[str], bool]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._session = None
+
+    @property
+    def api_url(self) -> str:
+        if self._api_url is None:
+            from nomad.config import config
+
+            self._api_url = config.api_url()
+        return self._api_url
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            session.headers['accept'] = 'application/json'
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def _get_cached(self, user_id: str):
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached is None:
+                return None
+            if cached[0] < time.monotonic():
+                del self._cache[user_id]
+                return None
+            self._cache.move_to_end(user_id)
+            return cached
+
+    def _set_cached(self, user_id: str, name: Optional[str], failed: bool) -> None:
+        ttl = self.error_ttl if failed else self.ttl
+        with self._lock:
+            self._cache[user_id] = (time.monotonic() + ttl, name, failed)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def _fetch(self, user_id: str) -> Optional[str]:
+        try:
+            response = self.session.get(
+                f'{self.api_url}/v1/users',
+                params={'user_id': user_id},
+                timeout=self.timeout,
+            )
+            if response.status_code != 200:
+                raise UserLookupError(
+                    'Error while fetching user data from the database.\n'
+                    f'Status code: {response.status_code}'
+                )
+            # A proxy may answer with an HTML error page instead of JSON
+            response_dict = response.json()
+            if 'data' in response_dict and len(response_dict['data']) > 0:
+                first_name = response_dict['data'][0].get('first_name', '')
+                last_name = response_dict['data'][0].get('last_name', '')
+                return f'{first_name} {last_name}'
+            return None
+        except UserLookupError:
+            raise
+        except Exception as e:
+            raise UserLookupError(f'Request to the NOMAD API failed: {e}') from e
+
+    def resolve(self, user_id: str) -> Optional[str]:
+        """
+        Get the full name of the NOMAD user with the id `user_id`.
+
+        Args:
+            user_id (str): The NOMAD user id.
+
+        Returns:
+            Optional[str]: The full name or `None` if the user does not exist.
+
+        Raises:
+            UserLookupError: If the API could not be asked, also if this failed
+                recently for the same user.
+        """
+        cached = self._get_cached(user_id)
+        if cached is not None:
+            _, name, failed = cached
+            if failed:
+                raise UserLookupError('The last lookup of this user failed')
+            return name
+        try:
+            name = self._fetch(user_id)
+        except UserLookupError:
+            self._set_cached(user_id, None, failed=True)
+            raise
+        self._set_cached(user_id, name, failed=False)
+        return name
+
+
+class DatamodelUserResolver(UserResolver):
+    """
+    Resolves NOMAD user ids with the user management of the NOMAD installation the
+    parser runs in, instead of calling the installation's own API over HTTP.
+
+    This only works inside a NOMAD worker, where the user management is configured.
+    """
+
+    def _fetch(self, user_id: str) -> Optional[str]:
+        from nomad.datamodel import User
+
+        try:
+            user = User.get(user_id=user_id)
+        except Exception as e:
+            raise UserLookupError(f'NOMAD user management failed: {e}') from e
+        if user is None:
+            return None
+        return f'{user.first_name or ""} {user.last_name or ""}'
+
+
+_resolvers: dict[bool, UserResolver] = {}
+_resolver_lock = threading.Lock()
+
+
+def get_user_resolver(in_process: bool = False) -> UserResolver:
+    """
+    Returns the process-wide user resolver.
+
+    Args:
+        in_process (bool, optional): If True, the resolver that uses the user
+            management of the running NOMAD installation is returned, otherwise
+            the one that asks the NOMAD API over HTTP.
+    """
+    with _resolver_lock:
+        if in_process not in _resolvers:
+            _resolvers[in_process] = (
+                DatamodelUserResolver() if in_process else UserResolver()
+            )
+        return _resolvers[in_process]
+
+
+def runs_in_nomad_worker(archive) -> bool:
+    """
+    Check if the archive is processed by a NOMAD worker, i.e. inside a NOMAD
+    installation, and not by a standalone parser run.
+    """
+    from nomad.datamodel.context import ServerContext
+
+    return isinstance(getattr(archive, 'm_context', None), ServerContext)
+
+
+def _read_user_name(entry_group: 'h5py.Group') -> str:
+    user_name = entry_group['user']['name'][()]
+    if isinstance(user_name, bytes):
+        return user_name.decode('utf-8')
+    return str(user_name)
+
+
+def read_user(
+    entry_group: 'h5py.Group',
+    logger: 'BoundLogger',
+    resolver: Optional[UserResolver] = None,
+) -> str:
+    """
+    Get the name of the user that performed the measurement.
+
+    If the file contains a NOMAD user id, the full name of that user is resolved.
+    Otherwise, or if the resolution fails, the user name stored in the file is used.
+
+    Args:
+        entry_group (h5py.Group): The CAMELS entry group of the file.
+        logger (BoundLogger): A structlog logger.
+        resolver (UserResolver, optional): Defaults to the process-wide resolver.
+
+    Returns:
+        str: The name of the user.
+    """
+    user_id = entry_group.get('user/identifier/identifier')
+    if user_id is None:
+        logger.warning('No NOMAD user found in the CAMELS file')
+        return _read_user_name(entry_group)
+    resolver = resolver or get_user_resolver()
+    try:
+        full_name = resolver.resolve(user_id[()].decode('utf-8'))
+    except UserLookupError as e:
+        logger.warning(f'Error while fetching user data from the database: {e}')
+        return _read_user_name(entry_group)
+    if full_name is None:
+        logger.warning('No NOMAD user found with the user id from the CAMELS file')
+        return _read_user_name(entry_group)
+    return full_name
@@ -1,6 +1,11 @@
+import hashlib
+import io
 import json
 import math
+import os
+from typing import Optional
 
+import numpy as np
 import yaml
 from nomad.datamodel.context import ClientContext
 
@@ -19,61 +24,277 @@ def get_hash_ref(upload_id, filename):
     return f'{get_reference(upload_id, get_entry_id(upload_id, filename))}#data'
 
 
+# Lists shorter than this are compared element by element
+MIN_ARRAY_COMPARE_LENGTH = 16
+
+
+def _numeric_arrays(list1, list2):
+    """
+    Converts two lists to NumPy arrays if both are homogeneous numeric (nested)
+    lists. Returns None otherwise.
+    """
+    if len(list1) < MIN_ARRAY_COMPARE_LENGTH:
+        return None
+    if not isinstance(list1[0], (int, float, list)) or not isinstance(
+        list2[0], (int, float, list)
+    ):
+        return None
+    try:
+        array1 = np.asarray(list1)
+        array2 = np.asarray(list2)
+    except (ValueError, TypeError):
+        # Ragged nested lists
+        return None
+    if array1.dtype.kind not in 'biuf' or array2.dtype.kind not in 'biuf':
+        return None
+    return array1, array2
+
+
 def nan_equal(a, b):
     """
     Compare two values with NaN values.
+
+    Dicts and lists are compared with an explicit stack instead of recursion, so
+    deeply nested values cannot hit the recursion limit. Long numeric lists are
+    compared as NumPy arrays, where NaN values are treated as equal.
     """
-    if isinstance(a, float) and isinstance(b, float):
-        return a == b or (math.isnan(a) and math.isnan(b))
-    elif isinstance(a, dict) and isinstance(b, dict):
-        return dict_nan_equal(a, b)
-    elif isinstance(a, list) and isinstance(b, list):
-        return list_nan_equal(a, b)
-    else:
-        return a == b
+    stack = [(a, b)]
+    while stack:
+        a, b = stack.pop()
+        if isinstance(a, float) and isinstance(b, float):
+            if not (a == b or (math.isnan(a) and math.isnan(b))):
+                return False
+        elif isinstance(a, dict) and isinstance(b, dict):
+            if len(a) != len(b) or a.keys() != b.keys():
+                return False
+            stack.extend((a[key], b[key]) for key in a)
+        elif isinstance(a, list) and isinstance(b, list):
+            if len(a) != len(b):
+                return False
+            arrays = _numeric_arrays(a, b)
+            if arrays is None:
+                stack.extend(zip(a, b))
+            elif not np.array_equal(*arrays, equal_nan=True):
+                return False
+        elif not a == b:
+            return False
+    return True
 
 
 def list_nan_equal(list1, list2):
     """
     Compare two lists with NaN values.
     """
-    if len(list1) != len(list2):
-        return False
-    for a, b in zip(list1, list2):
-        if not nan_equal(a, b):
-            return False
-    return True
+    return (
+        isinstance(list1, list) and isinstance(list2, list) and nan_equal(list1, list2)
+    )
 
 
 def dict_nan_equal(dict1, dict2):
     """
     Compare two dictionaries with NaN values.
     """
-    if set(dict1.keys()) != set(dict2.keys()):
-        return False
-    for key in dict1:
-        if not nan_equal(dict1[key], dict2[key]):
-            return False
-    return True
+    return (
+        isinstance(dict1, dict) and isinstance(dict2, dict) and nan_equal(dict1, dict2)
+    )
+
+
+def _encode_archive(entry, file_type):
+    """
+    Yields the encoded archive `entry` in chunks. JSON is encoded like `json.dump`
+    does, sections are serialized section by section while they are encoded.
+    """
+    if file_type == 'json':
+        if not isinstance(entry, dict):
+            entry = entry.m_to_dict(return_as_generator=True)
+        yield from json.JSONEncoder().iterencode(entry)
+    elif file_type == 'yaml':
+        if not isinstance(entry, dict):
+            entry = entry.m_to_dict()
+        yield yaml.dump(entry)
+
+
+def write_archive(entry, file, file_type) -> str:
+    """
+    Writes the archive `entry` to the open `file`.
+
+    If `entry` is a section and `file_type` is json, it is serialized section by
+    section while it is written, without materialising the full dict in memory.
+    Large lists, like the data of figures, are written in chunks.
+
+    Returns:
+        str: The SHA-256 hex digest of the written archive, see `archive_digest`.
+    """
+    digest = hashlib.sha256()
+    for chunk in _encode_archive(entry, file_type):
+        file.write(chunk)
+        digest.update(chunk.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def archive_digest(entry, file_type: str = 'json') -> str:
+    """
+    Computes the SHA-256 digest of the archive `entry` as `write_archive` writes
+    it, without materialising the encoded archive.
+
+    The digest is not canonical: the keys are encoded in the order of the dicts
+    and of the section definitions, so equal dicts with another key order have
+    different digests.
+
+    Args:
+        entry: An `EntryArchive` or its dict.
+        file_type (str, optional): Either json or yaml.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    for chunk in _encode_archive(entry, file_type):
+        digest.update(chunk.encode('utf-8'))
+    return digest.hexdigest()
+
+
+# The version of the stored digests, older ones are ignored
+DIGEST_VERSION = 2
+
+
+def digest_filename(filename: str) -> str:
+    """
+    Returns the name of the hidden file that stores the digest of the archive
+    `filename`. Hidden files are not matched by NOMAD.
+    """
+    directory, name = os.path.split(filename)
+    return os.path.join(directory, f'.{name}.sha256')
+
+
+def fingerprint_filename(filename: str) -> str:
+    """
+    Returns the name of the hidden file that stores the fingerprint of the mainfile
+    of the archive `filename`, next to its digest.
+    """
+    directory, name = os.path.split(filename)
+    return os.path.join(directory, f'.{name}.fingerprint')
+
+
+def write_fingerprint(context, filename: str, fingerprint: dict) -> None:
+    with context.raw_file(fingerprint_filename(filename), 'w') as file:
+        json.dump(fingerprint, file, sort_keys=True)
+
+
+def _raw_file_stat(context, filename) -> Optional[tuple[int, int]]:
+    """
+    The size and modification time of the raw file `filename`, `None` if the
+    raw files of the context are not files on disk.
+    """
+    try:
+        with context.raw_file(filename, 'rb') as file:
+            stat = os.fstat(file.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _write_digest(context, filename, digest) -> None:
+    stat = _raw_file_stat(context, filename)
+    record = {'sha256': digest, 'version': DIGEST_VERSION}
+    if stat is not None:
+        record['size'], record['mtime_ns'] = stat
+    with context.raw_file(digest_filename(filename), 'w') as digest_file:
+        json.dump(record, digest_file, sort_keys=True)
+
+
+def _read_stored_digest(context, filename):
+    """
+    The digest of the archive `filename` if the archive on disk is still the
+    one that was written with it. Archives edited since, e.g. in the NOMAD ELN,
+    have another size or modification time.
+    """
+    digest_file = digest_filename(filename)
+    if not context.raw_path_exists(digest_file):
+        return None
+    with context.raw_file(digest_file, 'r') as file:
+        try:
+            record = json.load(file)
+        except ValueError:
+            # Digests of older versions are not tied to the archive on disk
+            return None
+    stat = _raw_file_stat(context, filename)
+    if (
+        not isinstance(record, dict)
+        # Older versions hashed another encoding of the archive
+        or record.get('version') != DIGEST_VERSION
+        or stat is None
+        or (record.get('size'), record.get('mtime_ns')) != stat
+    ):
+        return None
+    return record.get('sha256')
+
+
+def _archive_content_is_equal(entry, context, filename, file_type) -> bool:
+    # Archives that were edited or written without a digest are compared in full
+    entry_dict = entry if isinstance(entry, dict) else entry.m_to_dict()
+    with context.raw_file(filename, 'r') as file:
+        if file_type == 'json':
+            existing_dict = json.load(file)
+        else:
+            existing_dict = yaml.safe_load(file)
+    return dict_nan_equal(existing_dict, entry_dict)
 
 
 def create_archive(
-    entry_dict, context, filename, file_type, logger, *, overwrite: bool = False
+    entry,
+    context,
+    filename,
+    file_type,
+    logger,
+    *,
+    overwrite: bool = False,
+    fingerprint: dict = None,
 ):
+    """
+    Creates the companion archive file `filename` in the upload of `context`.
+
+    An existing archive is only replaced if its content is equal or `overwrite` is
+    set. The content is compared by the digest that is stored next to the archive,
+    together with the size and modification time of the written archive. An
+    archive with the same digest is not written again. If the archive on disk
+    changed since, e.g. because it was edited in NOMAD, it is compared in full.
+    The archive is serialized once, while it is written or while its digest is
+    computed, unless it has to be compared in full.
+
+    Args:
+        entry: The archive to write, either an `EntryArchive` or its dict.
+        context: The context of the parsed archive.
+        filename (str): The name of the archive file.
+        file_type (str): Either json or yaml.
+        logger: A structlog logger.
+        overwrite (bool, optional): Overwrite an existing file with different content.
+        fingerprint (dict, optional): The fingerprint of the mainfile, stored next
+            to the archive if it is written, see `incremental`.
+    """
     file_exists = context.raw_path_exists(filename)
     dicts_are_equal = None
+    is_unchanged = False
     if isinstance(context, ClientContext):
         return None
-    if file_exists:
-        with context.raw_file(filename, 'r') as file:
-            existing_dict = yaml.safe_load(file)
-            dicts_are_equal = dict_nan_equal(existing_dict, entry_dict)
+    if file_exists and not overwrite:
+        stored_digest = _read_stored_digest(context, filename)
+        if stored_digest is not None:
+            # The archive on disk is byte for byte the one of the stored digest
+            dicts_are_equal = is_unchanged = stored_digest == archive_digest(
+                entry, file_type
+            )
+        else:
+            dicts_are_equal = _archive_content_is_equal(
+                entry, context, filename, file_type
+            )
     if not file_exists or overwrite or dicts_are_equal:
-        with context.raw_file(filename, 'w') as newfile:
-            if file_type == 'json':
-                json.dump(entry_dict, newfile)
-            elif file_type == 'yaml':
-                yaml.dump(entry_dict, newfile)
+        if not is_unchanged:
+            with context.raw_file(filename, 'w') as newfile:
+                digest = write_archive(entry, newfile, file_type)
+            _write_digest(context, filename, digest)
+        if fingerprint is not None:
+            write_fingerprint(context, filename, fingerprint)
         context.upload.process_updated_raw_file(filename, allow_modify=True)
     elif file_exists and not overwrite and not dicts_are_equal:
         logger.error(
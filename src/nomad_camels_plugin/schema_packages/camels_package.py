@@ -1,4 +1,4 @@
-from nomad.datamodel import Schema
+from nomad.datamodel import ArchiveSection, Schema
 from nomad.datamodel.hdf5 import HDF5Reference
 from nomad.datamodel.metainfo.annotations import (
     ELNAnnotation,
@@ -9,12 +9,211 @@ from nomad.datamodel.metainfo.annotations import (
 from nomad.datamodel.metainfo.basesections import (
     Measurement,
 )
-from nomad.metainfo import JSON, Datetime, Quantity, SchemaPackage, Section
+from nomad.metainfo import (
+    JSON,
+    Datetime,
+    Quantity,
+    SchemaPackage,
+    Section,
+    SubSection,
+)
 from nomad.datamodel.metainfo.plot import PlotSection, PlotlyFigure
+
 m_package = SchemaPackage()
 import numpy as np
 
 
+class CamelsFigureTrace(ArchiveSection):
+    """
+    A trace of a CAMELS plot whose data is not stored in the archive but in the
+    datasets of the CAMELS file.
+    """
+
+    m_def = Section(
+        a_h5web=H5WebAnnotation(axes='x', signal='y'),
+    )
+    name = Quantity(
+        type=str,
+        description='Name of the trace',
+    )
+    trace_metadata = Quantity(
+        type=JSON,
+        description="""
+        The Plotly attributes of the trace without its data. Data that is not stored
+        in the CAMELS file, e.g. of fits, is kept here.
+        """,
+    )
+    x = Quantity(
+        type=HDF5Reference,
+        description='Dataset of the x values of the trace',
+    )
+    y = Quantity(
+        type=HDF5Reference,
+        description='Dataset of the y values of the trace',
+    )
+    z = Quantity(
+        type=HDF5Reference,
+        description='Dataset of the z values of the trace',
+    )
+
+
+class CamelsFigureReference(ArchiveSection):
+    """
+    A CAMELS plot that only stores the layout and the trace metadata. The plotted
+    data is referenced in the CAMELS file.
+    """
+
+    m_def = Section(
+        a_h5web=H5WebAnnotation(signal='data_group'),
+    )
+    name = Quantity(
+        type=str,
+        description='Name of the plot',
+    )
+    layout = Quantity(
+        type=JSON,
+        description='The Plotly layout of the plot',
+    )
+    data_group = Quantity(
+        type=HDF5Reference,
+        description='The group in the CAMELS file that holds the plotted data',
+    )
+    traces = SubSection(
+        section_def=CamelsFigureTrace,
+        repeats=True,
+    )
+
+
+class DiodeCurveFit(ArchiveSection):
+    """
+    The fit of the linear region of a single I-V curve of a diode measurement.
+    """
+
+    figure = Quantity(
+        type=str,
+        description='Name of the plot that shows the curve',
+    )
+    curve = Quantity(
+        type=str,
+        description='Name of the fitted trace',
+    )
+    threshold_voltage = Quantity(
+        type=np.float64,
+        unit='volt',
+        description='Voltage at which the fitted line crosses 0 A.',
+    )
+    threshold_voltage_error = Quantity(
+        type=np.float64,
+        unit='volt',
+        description='Standard error of the fitted threshold voltage.',
+    )
+    serial_resistance = Quantity(
+        type=np.float64,
+        unit='ohm',
+        description='Inverse of the slope of the fitted line.',
+    )
+    serial_resistance_error = Quantity(
+        type=np.float64,
+        unit='ohm',
+        description='Standard error of the fitted series resistance.',
+    )
+    r_squared = Quantity(
+        type=np.float64,
+        description='Coefficient of determination of the fit.',
+    )
+    residual_rms = Quantity(
+        type=np.float64,
+        unit='ampere',
+        description='Root mean square of the residuals of the fit.',
+    )
+    start_voltage = Quantity(
+        type=np.float64,
+        unit='volt',
+        description='Lowest voltage of the automatically chosen fit window.',
+    )
+    n_points = Quantity(
+        type=np.int64,
+        description='Number of points in the fit window.',
+    )
+    error = Quantity(
+        type=str,
+        description='Why the curve could not be fitted.',
+    )
+
+
+class CamelsChannel(ArchiveSection):
+    """
+    A dataset in the `data` group of the CAMELS entry, described by its metadata.
+    """
+
+    name = Quantity(
+        type=str,
+        description='Name of the channel, e.g. demo_detectorX',
+    )
+    path = Quantity(
+        type=str,
+        description='Path of the dataset relative to the data group of the entry',
+    )
+    shape = Quantity(
+        type=np.int64,
+        shape=['*'],
+        description='Shape of the dataset',
+    )
+    dtype = Quantity(
+        type=str,
+        description='Data type of the dataset, e.g. float64 or string',
+    )
+    units = Quantity(
+        type=str,
+        description='The units attribute of the dataset',
+    )
+    chunks = Quantity(
+        type=np.int64,
+        shape=['*'],
+        description='Shape of the storage chunks, not set for contiguous datasets',
+    )
+
+
+class ChannelStatistics(ArchiveSection):
+    """
+    Summary statistics of a numeric dataset in the `data` group of the CAMELS
+    entry, so that measurements can be searched by their signal ranges.
+    """
+
+    name = Quantity(
+        type=str,
+        description='Name of the channel, e.g. demo_detectorX',
+    )
+    path = Quantity(
+        type=str,
+        description='Path of the dataset relative to the data group of the entry',
+    )
+    count = Quantity(
+        type=np.int64,
+        description='Number of recorded values that are not NaN',
+    )
+    nan_count = Quantity(
+        type=np.int64,
+        description='Number of NaN values',
+    )
+    minimum = Quantity(
+        type=np.float64,
+        description='Smallest recorded value',
+    )
+    maximum = Quantity(
+        type=np.float64,
+        description='Largest recorded value',
+    )
+    mean = Quantity(
+        type=np.float64,
+        description='Mean of the recorded values',
+    )
+    std = Quantity(
+        type=np.float64,
+        description='Population standard deviation of the recorded values',
+    )
+
+
 class CamelsMeasurement(Measurement, PlotSection, Schema):
     m_def = Section(
         a_eln=ELNAnnotation(
@@ -128,8 +327,21 @@ class CamelsMeasurement(Measurement, PlotSection, Schema):
         type=JSON,
         description='CAMELS instrument settings',
     )
-    hdf5_file = Quantity(
-        type=HDF5Reference
+    hdf5_file = Quantity(type=HDF5Reference)
+    figure_references = SubSection(
+        section_def=CamelsFigureReference,
+        repeats=True,
+        description='Plots whose data is referenced in the CAMELS file',
+    )
+    channels = SubSection(
+        section_def=CamelsChannel,
+        repeats=True,
+        description='Catalog of the datasets in the data group of the CAMELS file',
+    )
+    channel_statistics = SubSection(
+        section_def=ChannelStatistics,
+        repeats=True,
+        description='Summary statistics of every numeric channel of the CAMELS file',
     )
 
     def normalize(self, archive, logger: 'BoundLogger') -> None:
@@ -146,6 +358,7 @@ class CamelsMeasurement(Measurement, PlotSection, Schema):
         super(CamelsMeasurement, self).normalize(archive, logger)
         archive.results.eln.tags = archive.data.measurement_tags
 
+
 class CamelsMeasurementDiode(CamelsMeasurement):
     m_def = Section(
         a_eln=ELNAnnotation(
@@ -159,7 +372,14 @@ class CamelsMeasurementDiode(CamelsMeasurement):
                     'figures',
                     'hdf5_file',
                     'threshold_voltage',
+                    'threshold_voltage_error',
                     'serial_resistance',
+                    'serial_resistance_error',
+                    'fit_r_squared',
+                    'fit_residual_rms',
+                    'fit_start_voltage',
+                    'fit_points',
+                    'curve_fits',
                     'end_time',
                     'session_name',
                     'measurement_tags',
@@ -195,7 +415,67 @@ class CamelsMeasurementDiode(CamelsMeasurement):
             defaultDisplayUnit='ohm',
         ),
     )
-
+    threshold_voltage_error = Quantity(
+        type=np.float64,
+        unit='volt',
+        description='Standard error of the fitted threshold voltage.',
+        a_eln=ELNAnnotation(
+            component='NumberEditQuantity',
+            label='Threshold voltage error',
+            defaultDisplayUnit='volt',
+        ),
+    )
+    serial_resistance_error = Quantity(
+        type=np.float64,
+        unit='ohm',
+        description='Standard error of the fitted series resistance.',
+        a_eln=ELNAnnotation(
+            component='NumberEditQuantity',
+            label='Serial resistance error',
+            defaultDisplayUnit='ohm',
+        ),
+    )
+    fit_r_squared = Quantity(
+        type=np.float64,
+        description='Coefficient of determination of the fit of the linear region.',
+        a_eln=ELNAnnotation(
+            component='NumberEditQuantity',
+            label='Fit R²',
+        ),
+    )
+    fit_residual_rms = Quantity(
+        type=np.float64,
+        unit='ampere',
+        description='Root mean square of the residuals of the fit of the linear region.',
+        a_eln=ELNAnnotation(
+            component='NumberEditQuantity',
+            label='Fit residual RMS',
+            defaultDisplayUnit='ampere',
+        ),
+    )
+    fit_start_voltage = Quantity(
+        type=np.float64,
+        unit='volt',
+        description='Lowest voltage of the automatically chosen fit window.',
+        a_eln=ELNAnnotation(
+            component='NumberEditQuantity',
+            label='Fit window start',
+            defaultDisplayUnit='volt',
+        ),
+    )
+    fit_points = Quantity(
+        type=np.int64,
+        description='Number of points in the fit window.',
+        a_eln=ELNAnnotation(
+            component='NumberEditQuantity',
+            label='Fit points',
+        ),
+    )
+    curve_fits = SubSection(
+        section_def=DiodeCurveFit,
+        repeats=True,
+        description='The fits of all measured I-V curves.',
+    )
 
 
 m_package.__init_metainfo__()
@@ -0,0 +1,26 @@
+import json
+import subprocess
+import sys
+
+BENCHMARKS = 'benchmarks/run_benchmarks.py'
+
+
+def test_benchmarks_report(tmp_path):
+    output = tmp_path / 'results.json'
+    subprocess.run(
+        [sys.executable, BENCHMARKS, '--repeat', '1', '--output', str(output)],
+        capture_output=True,
+        check=True,
+    )
+    report = json.loads(output.read_text())
+    assert [result['size']['diode'] for result in report['results']] == [
+        False,
+        False,
+        False,
+        True,
+    ]
+    for result in report['results']:
+        assert result['parse_seconds'] > 0
+        assert result['parse_peak_memory_bytes'] > 0
+        assert result['is_mainfile_cold_seconds'] > 0
+        assert result['archive_bytes'] > 0
@@ -0,0 +1,79 @@
+import shutil
+
+import h5py
+
+from nomad_camels_plugin.parsers.bulk import bulk_parse, find_files, main
+
+CAMELS_FILE = 'tests/data/raw/test_CAMELS_file.nxs'
+
+
+def make_raw_dir(path):
+    (path / 'sub').mkdir(parents=True)
+    shutil.copy(CAMELS_FILE, path / 'sub' / 'measurement.nxs')
+    shutil.copy(CAMELS_FILE, path / 'broken.nxs')
+    with h5py.File(path / 'broken.nxs', 'a') as f:
+        del f['CAMELS_Session Name/instruments']
+    (path / 'notes.txt').write_text('not a CAMELS file')
+    return str(path)
+
+
+def archives(raw_dir):
+    return {
+        path.name: path.read_bytes() for path in sorted(raw_dir.glob('*.archive.json'))
+    }
+
+
+def test_bulk_parse(tmp_path):
+    raw_dir = make_raw_dir(tmp_path / 'raw')
+    progress = []
+    results = bulk_parse(
+        find_files([raw_dir]),
+        raw_dir,
+        workers=1,
+        progress=lambda done, total, result: progress.append((done, total)),
+    )
+    by_name = {result.path.rsplit('/', 1)[-1]: result for result in results}
+    assert by_name['measurement.nxs'].parser == 'CamelsParser'
+    assert by_name['measurement.nxs'].error is None
+    assert 'KeyError' in by_name['broken.nxs'].error
+    assert by_name['notes.txt'].parser is None
+    assert by_name['notes.txt'].error is None
+    assert sorted(progress) == [(1, 3), (2, 3), (3, 3)]
+    assert list(archives(tmp_path / 'raw')) == ['measurement.nxs.archive.json']
+
+
+def test_parallel_archives_equal_sequential(tmp_path, capsys):
+    sequential = make_raw_dir(tmp_path / 'sequential' / 'raw')
+    parallel = make_raw_dir(tmp_path / 'parallel' / 'raw')
+    assert main([sequential, '--workers', '1']) == 1
+    assert main([parallel, 'sub', '--workers', '2']) == 0
+    assert '1 parsed, 0 skipped, 0 failed' in capsys.readouterr().out
+    assert archives(tmp_path / 'sequential' / 'raw') == archives(
+        tmp_path / 'parallel' / 'raw'
+    )
+
+
+def test_files_with_the_same_archive_are_parsed_in_order(tmp_path):
+    results = {}
+    for run, workers in (('sequential', 1), ('parallel', 2)):
+        raw_dir = tmp_path / run / 'raw'
+        for directory in ('a', 'b'):
+            (raw_dir / directory).mkdir(parents=True)
+            shutil.copy(CAMELS_FILE, raw_dir / directory / 'x.nxs')
+        with h5py.File(raw_dir / 'b' / 'x.nxs', 'a') as f:
+            details = f['CAMELS_Session Name/measurement_details']
+            del details['measurement_description']
+            details['measurement_description'] = 'Another measurement'
+        results[run] = [
+            (result.path.split('/raw/')[1], result.error)
+            for result in bulk_parse(
+                find_files([str(raw_dir)]), str(raw_dir), workers=workers
+            )
+        ]
+    # Both files write x.nxs.archive.json, the second one must not overwrite it
+    assert results['parallel'] == results['sequential']
+    assert results['sequential'][0] == ('a/x.nxs', None)
+    assert 'already exists' in results['sequential'][1][1]
+    assert archives(tmp_path / 'sequential' / 'raw') == archives(
+        tmp_path / 'parallel' / 'raw'
+    )
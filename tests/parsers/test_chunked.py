@@ -0,0 +1,83 @@
+import logging
+import shutil
+
+import h5py
+import numpy as np
+import pytest
+from nomad.datamodel import EntryArchive
+
+from nomad_camels_plugin.parsers.chunked import (
+    block_rows,
+    dataset_statistics,
+    iter_blocks,
+    strided_step,
+)
+from nomad_camels_plugin.parsers.parser import CamelsParser
+
+CAMELS_FILE = 'tests/data/raw/test_CAMELS_file.nxs'
+ENTRY = 'CAMELS_Session Name'
+N_POINTS = 300_000
+
+
+def test_blocks_are_chunk_aligned(tmp_path):
+    values = np.random.default_rng(0).normal(size=10_000)
+    values[::97] = np.nan
+    with h5py.File(tmp_path / 'data.h5', 'w') as f:
+        dataset = f.create_dataset('values', data=values, chunks=(300,))
+        assert block_rows(dataset, 10_000) == 1200
+        starts = [start for start, _ in iter_blocks(dataset, 10_000)]
+        assert starts == list(range(0, 10_000, 1200))
+        statistics = dataset_statistics(dataset, 10_000)
+        assert strided_step(dataset, 1000) == 10
+    assert statistics.count == np.count_nonzero(~np.isnan(values))
+    assert statistics.nan_count == np.count_nonzero(np.isnan(values))
+    assert statistics.minimum == np.nanmin(values)
+    assert statistics.maximum == np.nanmax(values)
+    assert statistics.mean == pytest.approx(np.nanmean(values))
+    assert statistics.std == pytest.approx(np.nanstd(values))
+
+
+def _write_large_file(path):
+    shutil.copy(CAMELS_FILE, path)
+    x = np.linspace(0, 100, N_POINTS)
+    with h5py.File(path, 'r+') as f:
+        entry = f[ENTRY]
+        version = 'program/python_environment/suitcase-nomad-camels-hdf5'
+        del entry[version]
+        entry[version] = b'1.2.0'
+        plot = entry['data/Simple_Sweep'].create_group('plot_0')
+        plot.attrs['NX_class'] = 'NXdata'
+        plot.create_dataset('_plot_data_axes', data=x, chunks=(4096,))
+        plot['_plot_data_axes'].attrs['long_name'] = 'demo_motorX'
+        plot.create_dataset('_plot_data_signal', data=np.sin(x), chunks=(4096,))
+        plot['_plot_data_signal'].attrs.update(
+            long_name='demo_detectorX', y_axes_index=1
+        )
+        entry['instruments/demo/settings/waveform'] = np.arange(N_POINTS, dtype=float)
+
+
+def test_memory_bounded_parse(tmp_path):
+    path = tmp_path / 'raw' / 'large.nxs'
+    path.parent.mkdir()
+    _write_large_file(path)
+
+    def parse(**options):
+        return CamelsParser(max_trace_points=1000, **options).parse(
+            str(path), EntryArchive(), logging.getLogger(), testing=True
+        )
+
+    bounded, unbounded = parse(memory_limit_mb=16), parse()
+    (trace,) = bounded.figures[0].figure['data']
+    (full_trace,) = unbounded.figures[0].figure['data']
+    # The previews are the same as the ones downsampled in memory
+    assert trace['x'] == full_trace['x']
+    assert trace['y'] == full_trace['y']
+    assert trace['meta']['full_resolution'] == full_trace['meta']['full_resolution']
+    statistics = trace['meta']['statistics']
+    assert statistics['count'] == N_POINTS
+    assert statistics['max'] == pytest.approx(1, abs=1e-6)
+    # Large settings are only summarised
+    waveform = bounded.camels_instrument_settings['demo']['waveform']
+    assert waveform['shape'] == [N_POINTS]
+    assert waveform['mean'] == pytest.approx((N_POINTS - 1) / 2)
+    assert len(unbounded.camels_instrument_settings['demo']['waveform']) == N_POINTS
@@ -0,0 +1,131 @@
+import logging
+import shutil
+
+import h5py
+import numpy as np
+import pytest
+from nomad.datamodel import EntryArchive
+
+from nomad_camels_plugin.parsers.diode import DiodeFitError, fit_diode, fit_diodes
+from nomad_camels_plugin.parsers.parser import CamelsParserDiode
+
+CAMELS_FILE = 'tests/data/raw/test_CAMELS_file.nxs'
+SERIAL_RESISTANCE = 10.0
+
+
+def diode_curve(n_points=400, noise=0.0, seed=0):
+    # Shockley diode with a series resistor, sampled along the current
+    current = np.linspace(0, 0.2, n_points)
+    voltage = 1.8 * 0.02585 * np.log(current / 1e-12 + 1) + current * SERIAL_RESISTANCE
+    rng = np.random.default_rng(seed)
+    return voltage, current + rng.normal(0, noise, n_points)
+
+
+@pytest.mark.parametrize('noise', [0.0, 1e-4, 1e-3])
+def test_fit_diode(noise):
+    voltage, current = diode_curve(noise=noise)
+    fit = fit_diode(voltage, current)
+    assert fit.serial_resistance == pytest.approx(SERIAL_RESISTANCE, rel=0.06)
+    assert 0.8 < fit.threshold_voltage < 1.2
+    assert fit.r_squared > 0.99
+    assert fit.serial_resistance_error > 0
+    assert fit.threshold_voltage_error > 0
+    assert len(fit.residuals) == fit.n_points
+    assert fit.start_voltage >= voltage[0]
+
+
+def test_fit_diode_sweep_order_and_invalid_points():
+    voltage, current = diode_curve()
+    fit = fit_diode(voltage, current)
+    current = current.copy()
+    current[[3, 200]] = np.nan
+    reversed_fit = fit_diode(voltage[::-1], current[::-1])
+    assert reversed_fit.serial_resistance == pytest.approx(
+        fit.serial_resistance, rel=1e-3
+    )
+
+
+def test_fit_diode_without_conduction():
+    voltage = np.linspace(-1, 0, 50)
+    with pytest.raises(DiodeFitError):
+        fit_diode(voltage, np.zeros_like(voltage))
+    with pytest.raises(DiodeFitError):
+        fit_diode(voltage[:2], voltage[:2])
+
+
+def test_fit_diodes_matches_single_fits():
+    curves = [
+        diode_curve(n_points, noise, seed)
+        for seed, (n_points, noise) in enumerate(
+            [(400, 0.0), (150, 1e-4), (57, 1e-3), (300, 1e-4)]
+        )
+    ]
+    curves.append((np.linspace(-1, 0, 20), np.zeros(20)))
+    fits = fit_diodes([v for v, _ in curves], [c for _, c in curves])
+    assert len(fits.errors) == len(curves)
+    for index, (voltage, current) in enumerate(curves[:-1]):
+        single = fit_diode(voltage, current)
+        batched = fits.curve(index)
+        assert batched.n_points == single.n_points
+        assert batched.serial_resistance == pytest.approx(single.serial_resistance)
+        assert batched.threshold_voltage_error == pytest.approx(
+            single.threshold_voltage_error
+        )
+        np.testing.assert_allclose(batched.residuals, single.residuals, atol=1e-12)
+    assert fits.errors[-1] is not None
+    assert np.isnan(fits.serial_resistance[-1])
+    with pytest.raises(DiodeFitError):
+        fits.curve(len(curves) - 1)
+
+
+@pytest.fixture
+def diode_file(tmp_path):
+    path = tmp_path / 'raw' / 'diode_demo.nxs'
+    path.parent.mkdir()
+    shutil.copy(CAMELS_FILE, path)
+    voltage, current = diode_curve()
+    with h5py.File(path, 'a') as f:
+        entry = f['CAMELS_Session Name']
+        details = entry['measurement_details']
+        del details['measurement_tags']
+        details['measurement_tags'] = [b'diode', b'demo']
+        stream = entry['data/Simple_Sweep']
+        for name, values in (('demo_motorX', voltage), ('demo_detectorX', current)):
+            attrs = dict(stream[name].attrs)
+            del stream[name]
+            stream[name] = values
+            stream[name].attrs.update(attrs)
+    return str(path)
+
+
+def test_parse_diode_file(diode_file):
+    parser = CamelsParserDiode()
+    assert parser.is_mainfile(diode_file, 'application/x-hdf', b'', '')
+    data = parser.parse(diode_file, EntryArchive(), logging.getLogger(), testing=True)
+    assert data.serial_resistance.magnitude == pytest.approx(
+        SERIAL_RESISTANCE, rel=0.06
+    )
+    assert data.fit_r_squared > 0.99
+    assert data.fit_points > 5
+    assert data.serial_resistance_error.magnitude > 0
+    (curve_fit,) = data.curve_fits
+    assert curve_fit.curve == 'demo_detectorX'
+    assert curve_fit.error is None
+    assert curve_fit.serial_resistance == data.serial_resistance
+    (figure,) = data.figures
+    assert [trace['name'] for trace in figure.figure['data']] == [
+        'demo_detectorX',
+        'Fit Line',
+    ]
+
+
+def test_memory_bounded_diode_fit(diode_file, caplog):
+    parser = CamelsParserDiode(memory_limit_mb=1, max_trace_points=100)
+    logger = logging.getLogger('camels.test')
+    with caplog.at_level(logging.INFO, logger='camels.test'):
+        data = parser.parse(diode_file, EntryArchive(), logger, testing=True)
+    assert 'fitted with every 4th point' in caplog.text
+    assert data.serial_resistance.magnitude == pytest.approx(
+        SERIAL_RESISTANCE, rel=0.06
+    )
+    assert data.fit_points <= 100
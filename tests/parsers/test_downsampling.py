@@ -0,0 +1,82 @@
+import h5py
+import numpy as np
+import pytest
+
+from nomad_camels_plugin.parsers.downsampling import (
+    DownsamplingMethod,
+    downsample,
+    lttb_indices,
+    minmax_indices,
+)
+from nomad_camels_plugin.parsers.figures import downsample_figure
+
+
+@pytest.mark.parametrize('method', list(DownsamplingMethod))
+def test_downsampling_keeps_shape(method):
+    x = np.linspace(0, 10, 100_000)
+    y = np.sin(x)
+    y[54_321] = 5.0  # a single spike must survive
+    indices = downsample(x, y, 1000, method)
+    assert len(indices) <= 1000
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert np.all(np.diff(indices) > 0)
+    assert 54_321 in indices
+    assert y[indices].min() == pytest.approx(-1, abs=1e-3)
+
+
+def test_short_traces_are_kept():
+    y = np.arange(10.0)
+    assert np.array_equal(lttb_indices(y, y, 100), np.arange(10))
+    assert np.array_equal(minmax_indices(y, 100), np.arange(10))
+
+
+def test_downsample_figure_links_full_resolution(tmp_path):
+    x = np.linspace(0, 1, 20_000)
+    y = x**2
+    with h5py.File(tmp_path / 'camels.nxs', 'w') as f:
+        stream = f.create_group('CAMELS_entry/data/sweep')
+        stream['motor'] = x
+        stream['detector'] = y
+        figure_json = {
+            'data': [
+                {'type': 'scatter', 'name': 'detector', 'x': x, 'y': y},
+                # e.g. built from a formula of the detector
+                {
+                    'type': 'scatter',
+                    'name': '2 * detector',
+                    'x': stream['motor'],
+                    'y': 2 * y,
+                },
+            ],
+            'layout': {'xaxis': {'title': {'text': 'motor'}}},
+        }
+        downsample_figure(figure_json, 500, DownsamplingMethod.LTTB, 'camels.nxs')
+    calculated, formula = figure_json['data']
+    assert len(calculated['x']) == len(calculated['y']) <= 500
+    # values that were not read from a dataset are not linked by their values
+    assert calculated['meta'] == {
+        'downsampling': 'lttb',
+        'measured_points': 20_000,
+        'full_resolution': {},
+    }
+    assert formula['meta']['full_resolution'] == {
+        'x': 'camels.nxs#/CAMELS_entry/data/sweep/motor'
+    }
+
+
+def test_lazy_traces_link_their_datasets(tmp_path):
+    x = np.linspace(0, 1, 20_000)
+    with h5py.File(tmp_path / 'camels.nxs', 'w') as f:
+        stream = f.create_group('CAMELS_entry/data/sweep')
+        stream['motor'] = x
+        stream['detector'] = x**2
+        figure_json = {
+            'data': [{'type': 'scatter', 'x': stream['motor'], 'y': stream['detector']}]
+        }
+        downsample_figure(figure_json, 500, DownsamplingMethod.LTTB, 'camels.nxs')
+    (trace,) = figure_json['data']
+    assert len(trace['x']) == len(trace['y']) <= 500
+    assert trace['meta']['full_resolution'] == {
+        'x': 'camels.nxs#/CAMELS_entry/data/sweep/motor',
+        'y': 'camels.nxs#/CAMELS_entry/data/sweep/detector',
+    }
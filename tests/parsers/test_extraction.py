@@ -0,0 +1,117 @@
+import h5py
+import numpy as np
+import pytest
+
+from nomad_camels_plugin.parsers.extraction import (
+    decode_settings_array,
+    read_channel_catalog,
+    read_channel_statistics,
+    read_instruments,
+)
+from nomad_camels_plugin.schema_packages.camels_package import CamelsMeasurement
+
+
+def test_read_instruments_nested_settings(tmp_path):
+    path = tmp_path / 'instruments.h5'
+    with h5py.File(path, 'w') as f:
+        instruments = f.create_group('CAMELS_entry/instruments')
+        settings = instruments.create_group('keithley/settings')
+        settings['voltage'] = 2.5
+        settings['mode'] = b'sweep'
+        settings['points'] = b'11'
+        settings['channels'] = np.array([b'1', b'2.5', b'off'])
+        settings['levels/range/upper'] = np.array([1.0, 2.0])
+        settings['levels/range/lower'] = np.array([-1])
+        eln = instruments.create_group('demo/fabrication/ELN-metadata')
+        eln['full_identifier'] = b'https://nomad/upload/id/abc/entry/id/def'
+        instruments.create_group('demo/settings')
+
+    with h5py.File(path, 'r') as f:
+        references, settings = read_instruments(f['CAMELS_entry'])
+
+    assert [reference.name for reference in references] == ['demo', 'keithley']
+    assert references[0].reference.m_proxy_value == '../uploads/abc/archive/def#/data'
+    assert references[1].reference is None
+    assert settings == {
+        'demo': {},
+        'keithley': {
+            'channels': [1, 2.5, 'off'],
+            'levels': {'range': {'lower': -1, 'upper': [1.0, 2.0]}},
+            'mode': 'sweep',
+            'points': 11,
+            'voltage': 2.5,
+        },
+    }
+
+
+def test_decode_settings_array_in_bulk():
+    waveform = np.linspace(0, 1, 10_000)
+    assert decode_settings_array(waveform) == waveform.tolist()
+    assert decode_settings_array(np.array([b'1', b'2.5', b'-3'], dtype=object)) == [
+        1,
+        2.5,
+        -3,
+    ]
+    assert decode_settings_array(np.array([[b'1', b'2'], [b'3', b'4']])) == [
+        [1, 2],
+        [3, 4],
+    ]
+    assert decode_settings_array(np.array([b'on', b'1'], dtype=object)) == ['on', 1]
+    # ints wider than int64 are kept as Python ints
+    assert decode_settings_array(np.array([b'12345678901234567890', b'1'])) == [
+        12345678901234567890,
+        1,
+    ]
+    assert decode_settings_array(np.array([b'12345678901234567890', b'0.5'])) == [
+        12345678901234567890,
+        0.5,
+    ]
+
+
+def test_read_channel_statistics_in_blocks(tmp_path):
+    current = np.random.default_rng(0).normal(1e-3, 1e-4, 50_000)
+    current[100] = np.nan
+    with h5py.File(tmp_path / 'data.h5', 'w') as f:
+        stream = f.create_group('CAMELS_entry/data/sweep')
+        stream.create_dataset('current', data=current, chunks=(1000,))
+        stream['voltage'] = np.linspace(0, 2, 50_000)
+        stream['label'] = np.array([b'a', b'b'])
+        stream['plot_0/_plot_data_signal'] = current
+        data = CamelsMeasurement()
+        read_channel_statistics(f['CAMELS_entry'], data, max_bytes=8000)
+
+    assert [channel.path for channel in data.channel_statistics] == [
+        'sweep/current',
+        'sweep/voltage',
+    ]
+    channel = data.channel_statistics[0]
+    assert channel.name == 'current'
+    assert (channel.count, channel.nan_count) == (49_999, 1)
+    assert channel.minimum == np.nanmin(current)
+    assert channel.maximum == np.nanmax(current)
+    assert channel.mean == pytest.approx(np.nanmean(current))
+    assert channel.std == pytest.approx(np.nanstd(current))
+
+
+def test_channel_catalog_reads_no_data(tmp_path, monkeypatch):
+    with h5py.File(tmp_path / 'data.h5', 'w') as f:
+        stream = f.create_group('CAMELS_entry/data/sweep')
+        stream.create_dataset('current', data=np.zeros((100, 3)), chunks=(10, 3))
+        stream['current'].attrs['units'] = 'A'
+        stream['label'] = np.array([b'a', b'b'], dtype=h5py.string_dtype())
+        stream['plot_0/_plot_data_signal'] = np.zeros(5)
+
+    def read(*args):
+        raise AssertionError('The catalog must not read data')
+
+    monkeypatch.setattr(h5py.Dataset, '__getitem__', read)
+    with h5py.File(tmp_path / 'data.h5', 'r') as f:
+        data = CamelsMeasurement()
+        read_channel_catalog(f['CAMELS_entry'], data)
+
+    current, label = data.channels
+    assert (current.name, current.path) == ('current', 'sweep/current')
+    assert list(current.shape) == [100, 3]
+    assert list(current.chunks) == [10, 3]
+    assert (current.dtype, current.units) == ('float64', 'A')
+    assert (label.dtype, label.units, label.chunks) == ('string', None, None)
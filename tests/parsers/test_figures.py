@@ -0,0 +1,55 @@
+import logging
+
+import h5py
+import numpy as np
+from nomad.datamodel import EntryArchive
+
+from nomad_camels_plugin.parsers.figures import reference_figure
+from nomad_camels_plugin.parsers.parser import CamelsParser
+
+CAMELS_FILE = 'tests/data/raw/test_CAMELS_file.nxs'
+
+
+def test_reference_mode_does_not_inline_data():
+    data = CamelsParser(figure_mode='reference').parse(
+        CAMELS_FILE, EntryArchive(), logging.getLogger(), testing=True
+    )
+    assert len(data.figures) == 0
+    assert len(data.figure_references) == 1
+    figure = data.figure_references[0]
+    assert figure.data_group == (
+        'test_CAMELS_file.nxs#/CAMELS_Session Name/data/Simple_Sweep'
+    )
+    assert 'template' not in figure.layout
+    (trace,) = figure.traces
+    assert trace.x == (
+        'test_CAMELS_file.nxs#/CAMELS_Session Name/data/Simple_Sweep/demo_motorX'
+    )
+    assert trace.y == (
+        'test_CAMELS_file.nxs#/CAMELS_Session Name/data/Simple_Sweep/demo_detectorX'
+    )
+    assert not {'x', 'y', 'z'} & set(trace.trace_metadata)
+
+
+def test_reference_figure_reduces_calculated_data(tmp_path):
+    x = np.linspace(0, 1, 1000)
+    with h5py.File(tmp_path / 'data.h5', 'w') as f:
+        f['data/stream/x'] = x
+        figure_json = {
+            'data': [
+                {'name': 'Fit', 'x': f['data/stream/x'], 'y': np.sin(x)},
+                {'name': 'Map', 'z': np.ones((50, 50))},
+            ],
+            'layout': {},
+        }
+        figure = reference_figure('stream: fit', figure_json, f, 'data.h5', 100)
+    fit, heatmap = figure.traces
+    # the downsampled x values stay paired with the calculated y values
+    assert fit.x is None
+    assert len(fit.trace_metadata['x']) == len(fit.trace_metadata['y']) <= 100
+    assert fit.trace_metadata['meta']['measured_points'] == 1000
+    assert fit.trace_metadata['meta']['full_resolution'] == {
+        'x': 'data.h5#/data/stream/x'
+    }
+    assert 'z' not in heatmap.trace_metadata
+    assert heatmap.trace_metadata['meta']['omitted'] == ['z']
@@ -0,0 +1,42 @@
+import h5py
+
+from nomad_camels_plugin.parsers import hdf5_session
+from nomad_camels_plugin.parsers.hdf5_session import (
+    get_hdf5_file,
+    open_handle_count,
+    release_all,
+)
+
+CAMELS_FILE = 'tests/data/raw/test_CAMELS_file.nxs'
+
+
+def test_handle_is_shared_and_released():
+    release_all()
+    first = get_hdf5_file(CAMELS_FILE)
+    with hdf5_session.hdf5_session(CAMELS_FILE) as hdf5_file:
+        # matching and parsing use the very same handle
+        assert hdf5_file is first
+        assert hdf5_file.id.valid
+        assert open_handle_count() == 1
+    # the session closes the handle once the entry is done
+    assert not first.id.valid
+    assert open_handle_count() == 0
+
+
+def test_unpinned_handles_are_bounded(tmp_path, monkeypatch):
+    release_all()
+    monkeypatch.setattr(hdf5_session, 'MAX_OPEN_HANDLES', 2)
+    paths = []
+    for index in range(4):
+        path = tmp_path / f'file_{index}.h5'
+        with h5py.File(path, 'w') as f:
+            f.attrs['index'] = index
+        paths.append(str(path))
+    with hdf5_session.hdf5_session(paths[0]):
+        for path in paths[1:]:
+            get_hdf5_file(path)
+        # the pinned handle survives the eviction of the others
+        assert open_handle_count() == 2
+        assert get_hdf5_file(paths[0]).id.valid
+    release_all()
+    assert open_handle_count() == 0
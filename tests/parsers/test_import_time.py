@@ -0,0 +1,45 @@
+import json
+import subprocess
+import sys
+
+# Modules that are only needed to parse a CAMELS file, not to match it. NOMAD
+# itself does not import them when its parsers are loaded.
+LAZY_MODULES = (
+    'h5py',
+    'plotly',
+    'lmfit',
+    'nomad_camels_toolbox',
+    'nomad.datamodel.metainfo.basesections',
+    'nomad_camels_plugin.schema_packages.camels_package',
+    'nomad_camels_plugin.parsers.extraction',
+    'nomad_camels_plugin.parsers.plots',
+)
+# Generous upper bound for importing the parser on top of NOMAD. Loading the
+# parsing modules eagerly takes more than a second.
+MAX_IMPORT_SECONDS = 0.5
+
+MEASURE_IMPORT = """
+import json, sys, time
+import nomad.parsing.parser
+import nomad_camels_plugin.parsers
+before = set(sys.modules)
+start = time.perf_counter()
+from nomad_camels_plugin.parsers.parser import CamelsParser, CamelsParserDiode
+CamelsParser(), CamelsParserDiode()
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'modules': sorted(set(sys.modules) - before)}))
+"""
+
+
+def test_parser_import_is_lazy():
+    result = subprocess.run(
+        [sys.executable, '-c', MEASURE_IMPORT],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f'Parser import took {measurement["seconds"]:.3f} s')
+    eager = set(LAZY_MODULES) & set(measurement['modules'])
+    assert not eager, f'Imported together with the parser: {sorted(eager)}'
+    assert measurement['seconds'] < MAX_IMPORT_SECONDS
@@ -0,0 +1,63 @@
+import json
+import logging
+import os
+import shutil
+
+import h5py
+from nomad.datamodel import EntryArchive
+from nomad.datamodel.datamodel import EntryMetadata
+
+from nomad_camels_plugin.parsers import incremental
+from nomad_camels_plugin.parsers.bulk import LocalUploadContext
+from nomad_camels_plugin.parsers.parser import CamelsParser
+
+CAMELS_FILE = 'tests/data/raw/test_CAMELS_file.nxs'
+FINGERPRINT = '.measurement.nxs.archive.json.fingerprint'
+
+
+def test_unchanged_files_are_skipped(tmp_path, caplog, monkeypatch):
+    raw_dir = tmp_path / 'raw'
+    raw_dir.mkdir()
+    mainfile = raw_dir / 'measurement.nxs'
+    shutil.copy(CAMELS_FILE, mainfile)
+    logger = logging.getLogger('camels.test')
+
+    def parse(**options):
+        archive = EntryArchive(
+            m_context=LocalUploadContext(str(raw_dir)),
+            metadata=EntryMetadata(mainfile='measurement.nxs'),
+        )
+        caplog.clear()
+        with caplog.at_level(logging.INFO, logger='camels.test'):
+            CamelsParser(incremental=True, **options).parse(
+                str(mainfile), archive, logger
+            )
+        return 'measurement.nxs is unchanged' not in caplog.text
+
+    assert parse()
+    fingerprint = json.loads((raw_dir / FINGERPRINT).read_text())
+    assert fingerprint['size'] == os.path.getsize(mainfile)
+    assert fingerprint['parser']['figure_mode'] == 'inline'
+    assert not parse()
+
+    # A touched file is hashed again, its fingerprint gets the new time
+    os.utime(mainfile, ns=(0, 0))
+    assert not parse()
+    assert json.loads((raw_dir / FINGERPRINT).read_text())['mtime_ns'] == 0
+
+    # Other parser options change the archive
+    assert parse(max_trace_points=5)
+
+    # So does a NOMAD upgrade
+    assert fingerprint['nomad_version'] == incremental.nomad_version()
+    assert not parse()
+    monkeypatch.setattr(incremental, 'nomad_version', lambda: '99.0.0')
+    assert parse()
+    monkeypatch.undo()
+
+    with h5py.File(mainfile, 'a') as f:
+        f.attrs['comment'] = 'changed'
+    assert parse()
+    changed = json.loads((raw_dir / FINGERPRINT).read_text())
+    assert changed['content_sha256'] != fingerprint['content_sha256']
+    assert not parse()
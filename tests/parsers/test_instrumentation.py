@@ -0,0 +1,82 @@
+import logging
+import pstats
+import threading
+import time
+
+import pytest
+from nomad.datamodel import EntryArchive
+
+from nomad_camels_plugin.parsers.instrumentation import (
+    RssSampler,
+    log_with_fields,
+    peak_rss,
+    rss,
+)
+from nomad_camels_plugin.parsers.parser import CamelsParser
+
+CAMELS_FILE = 'tests/data/raw/test_CAMELS_file.nxs'
+
+
+def test_stages_are_timed(caplog):
+    logger = logging.getLogger('camels.test')
+    with caplog.at_level(logging.DEBUG, logger='camels.test'):
+        CamelsParser().parse(CAMELS_FILE, EntryArchive(), logger, testing=True)
+    stages = [
+        record.stage
+        for record in caplog.records
+        if record.getMessage().startswith('CAMELS parser stage finished')
+    ]
+    assert stages == [
+        'metadata',
+        'samples',
+        'instruments',
+        'channel catalog',
+        'channel statistics',
+        'user',
+        'figures',
+        'store figures',
+    ]
+    (summary,) = [
+        record
+        for record in caplog.records
+        if record.getMessage().startswith('CAMELS entry parsed')
+    ]
+    assert list(summary.stage_durations) == stages
+    assert summary.duration >= 0
+    assert summary.peak_rss_bytes > 0
+
+
+@pytest.mark.skipif(rss() is None, reason='needs /proc/self/status')
+def test_rss_sampler_keeps_the_process_peak():
+    process_peak = peak_rss()
+    with RssSampler(interval=0.001) as memory:
+        allocation = b'\x01' * (64 * 2**20)
+        time.sleep(0.05)
+        del allocation
+    assert memory.peak - memory.start >= 32 * 2**20
+    assert peak_rss() >= process_peak
+
+
+def test_disabled_rss_sampler_does_not_read():
+    with RssSampler(enabled=False) as memory:
+        assert not any(
+            thread.name == 'camels-rss-sampler' for thread in threading.enumerate()
+        )
+    assert memory.start is None and memory.peak is None
+
+
+def test_disabled_levels_are_not_formatted():
+    class Unformattable:
+        def __format__(self, spec):
+            raise AssertionError('formatted although the level is disabled')
+
+    logger = logging.getLogger('camels.test.quiet')
+    logger.setLevel(logging.INFO)
+    log_with_fields(logger, logging.DEBUG, 'event', value=Unformattable())
+
+
+def test_cprofile_per_entry(tmp_path):
+    parser = CamelsParser(profiler='cprofile', profile_dir=str(tmp_path))
+    parser.parse(CAMELS_FILE, EntryArchive(), logging.getLogger(), testing=True)
+    profile = tmp_path / 'test_CAMELS_file.nxs.prof'
+    assert pstats.Stats(str(profile)).total_calls > 0
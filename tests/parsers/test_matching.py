@@ -0,0 +1,75 @@
+import h5py
+
+from nomad_camels_plugin.parsers import matching
+from nomad_camels_plugin.parsers.matching import (
+    CamelsFileKind,
+    classify_camels_file,
+    prefilter_buffer,
+)
+from nomad_camels_plugin.parsers.parser import CamelsParser, CamelsParserDiode
+
+CAMELS_FILE = 'tests/data/raw/test_CAMELS_file.nxs'
+MATCHING_SIZE = 150 * 80
+
+
+def read_buffer(path):
+    with open(path, 'rb') as f:
+        return f.read(MATCHING_SIZE)
+
+
+def test_prefilter_buffer(tmp_path):
+    assert prefilter_buffer(b'') is None
+    assert prefilter_buffer(read_buffer(CAMELS_FILE)) is True
+    assert prefilter_buffer(b'NOMAD CAMELS but not an HDF5 file') is False
+
+    nexus_file = tmp_path / 'foreign.nxs'
+    with h5py.File(nexus_file, 'w') as f:
+        f.attrs['NX_class'] = 'NXroot'
+        f.create_group('entry').create_dataset('data', data=[1, 2, 3])
+    assert prefilter_buffer(read_buffer(nexus_file)) is False
+
+
+def test_foreign_file_is_rejected_without_h5py(tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('h5py must not be used for foreign files')
+
+    monkeypatch.setattr(matching, 'get_hdf5_file', fail)
+    foreign_file = tmp_path / 'foreign.h5'
+    foreign_file.write_bytes(b'\x00' * 64)
+    for parser in (CamelsParser(), CamelsParserDiode()):
+        assert (
+            parser.is_mainfile(
+                filename=str(foreign_file),
+                mime='application/x-hdf',
+                buffer=read_buffer(foreign_file),
+                decoded_buffer='',
+            )
+            is False
+        )
+
+
+def test_classification_is_cached(tmp_path, monkeypatch):
+    opened = []
+
+    def counting_get_hdf5_file(path):
+        opened.append(path)
+        return h5py.File(path, 'r')
+
+    monkeypatch.setattr(matching, 'get_hdf5_file', counting_get_hdf5_file)
+    matching._classify.cache_clear()
+    camels_file = tmp_path / 'camels.nxs'
+    camels_file.write_bytes(open(CAMELS_FILE, 'rb').read())
+
+    # both parsers consult the same verdict, the file is inspected only once
+    assert CamelsParser().is_mainfile(str(camels_file), 'application/x-hdf', b'', '')
+    assert not CamelsParserDiode().is_mainfile(
+        str(camels_file), 'application/x-hdf', b'', ''
+    )
+    assert classify_camels_file(str(camels_file)) is CamelsFileKind.GENERIC
+    assert len(opened) == 1
+
+    # a modified file is classified again
+    with h5py.File(camels_file, 'a') as f:
+        f.attrs['file_type'] = 'something else'
+    assert classify_camels_file(str(camels_file)) is CamelsFileKind.FOREIGN
+    assert len(opened) == 2
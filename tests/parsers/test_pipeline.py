@@ -0,0 +1,38 @@
+import logging
+
+from nomad.datamodel import EntryArchive
+
+from nomad_camels_plugin.parsers.parser import CamelsParser
+from nomad_camels_plugin.parsers.pipeline import EXTRACTION_STAGES, Stage
+
+CAMELS_FILE = 'tests/data/raw/test_CAMELS_file.nxs'
+
+
+def test_analysis_stages_run_on_extracted_data():
+    seen = []
+
+    def analyse(context):
+        # All extraction stages ran, the figures are not yet added
+        seen.append((context.data.camels_user, list(context.figures)))
+        context.data.description = 'analysed'
+
+    class AnalysingParser(CamelsParser):
+        def analysis_stages(self):
+            return (Stage('test analysis', analyse),)
+
+    data = AnalysingParser().parse(
+        CAMELS_FILE, EntryArchive(), logging.getLogger(), testing=True
+    )
+    assert [stage.name for stage in EXTRACTION_STAGES] == [
+        'metadata',
+        'samples',
+        'instruments',
+        'channel catalog',
+        'channel statistics',
+        'user',
+        'figures',
+    ]
+    assert seen == [('default_user', ['Simple_Sweep: demo_detectorX vs. demo_motorX'])]
+    assert len(data.figures) == 1
+    assert data.description == 'analysed'
+    assert data.hdf5_file == 'test_CAMELS_file.nxs#/CAMELS_Session Name/data'
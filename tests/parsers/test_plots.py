@@ -0,0 +1,98 @@
+import json
+import warnings
+
+import h5py
+import numpy as np
+import pytest
+
+from nomad_camels_plugin.parsers.plots import (
+    UnsupportedPlotError,
+    build_figures,
+    recreate_figures,
+)
+
+CAMELS_FILE = 'tests/data/raw/test_CAMELS_file.nxs'
+
+
+def as_json(figures):
+    return json.loads(
+        json.dumps(figures, default=lambda value: np.asarray(value).tolist())
+    )
+
+
+def toolbox_figures(path):
+    import nomad_camels_toolbox as nct
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        plots = nct.recreate_plots(path, show_figures=False)
+    return as_json({key: plot.to_plotly_json() for key, plot in plots.items()})
+
+
+@pytest.fixture
+def plot_group_file(tmp_path):
+    path = str(tmp_path / 'plot_groups.nxs')
+    with h5py.File(path, 'w') as f:
+        entry = f.create_group('CAMELS_entry')
+        entry['program/python_environment/suitcase-nomad-camels-hdf5'] = b'1.2.0'
+        plot = entry.create_group('data/plot_1')
+        plot.attrs['NX_class'] = 'NXdata'
+        plot['_plot_data_axes'] = np.linspace(0, 1, 5)
+        plot['_plot_data_axes'].attrs['long_name'] = 'motor'
+        plot['_plot_data_signal'] = np.arange(5.0)
+        plot['_plot_data_signal'].attrs.update(
+            long_name='detector_a + detector_b - 3 * offset', y_axes_index=1
+        )
+        plot['_plot_data_signal_1'] = np.arange(5.0) ** 2
+        plot['_plot_data_signal_1'].attrs.update(long_name='other', y_axes_index=2)
+        plot_2d = entry.create_group('data/sub_step/plot_2')
+        plot_2d.attrs['NX_class'] = 'NXdata'
+        for name, values in (
+            ('_plot_data_axes_0', np.arange(4.0)),
+            ('_plot_data_axes_1', np.arange(4.0)),
+            ('_plot_data_signal', np.arange(16.0).reshape(4, 4)),
+        ):
+            plot_2d[name] = values
+            plot_2d[name].attrs['long_name'] = name
+    return path
+
+
+@pytest.mark.parametrize('path', [CAMELS_FILE, 'plot_group_file'])
+def test_figures_match_toolbox(path, request):
+    if path == 'plot_group_file':
+        path = request.getfixturevalue(path)
+    with h5py.File(path, 'r') as f:
+        entry_key = next(key for key in f if key.startswith('CAMELS_'))
+        figures = build_figures(f[entry_key])
+    assert as_json(figures) == toolbox_figures(path)
+
+
+def test_protocol_figures_keep_datasets_if_lazy():
+    with h5py.File(CAMELS_FILE, 'r') as f:
+        entry = f['CAMELS_Session Name']
+        figures = build_figures(entry, lazy=True)
+        (trace,) = next(iter(figures.values()))['data']
+        assert isinstance(trace['x'], h5py.Dataset)
+        assert isinstance(trace['y'], h5py.Dataset)
+        assert as_json(figures) == as_json(build_figures(entry))
+
+
+def test_fits_fall_back_to_toolbox(plot_group_file, monkeypatch):
+    with h5py.File(plot_group_file, 'a') as f:
+        f['CAMELS_entry/data/plot_1'].create_group('fit')
+    with h5py.File(plot_group_file, 'r') as f:
+        with pytest.raises(UnsupportedPlotError):
+            build_figures(f['CAMELS_entry'])
+
+    import nomad_camels_toolbox as nct
+
+    class FakeFigure:
+        def to_plotly_json(self):
+            return {'data': [], 'layout': {}}
+
+    monkeypatch.setattr(
+        nct, 'recreate_plots', lambda *args, **kwargs: {'plot': FakeFigure()}
+    )
+    with h5py.File(plot_group_file, 'r') as f:
+        figures = recreate_figures(f['CAMELS_entry'], plot_group_file)
+    assert figures == {'plot': {'data': [], 'layout': {}}}
@@ -0,0 +1,122 @@
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import h5py
+import pytest
+
+from nomad_camels_plugin.parsers.users import (
+    DatamodelUserResolver,
+    UserLookupError,
+    UserResolver,
+    get_user_resolver,
+    read_user,
+    runs_in_nomad_worker,
+)
+
+USERS = {'id-1': {'first_name': 'Ada', 'last_name': 'Lovelace'}}
+
+
+class StubUsersHandler(BaseHTTPRequestHandler):
+    requests = []
+    delay = 0.0
+    # Sent instead of the JSON reply if set, e.g. an error page of a proxy
+    html = None
+
+    def do_GET(self):
+        user_id = parse_qs(urlparse(self.path).query)['user_id'][0]
+        type(self).requests.append(user_id)
+        time.sleep(type(self).delay)
+        users = [USERS[user_id]] if user_id in USERS else []
+        body = json.dumps({'data': users}).encode()
+        content_type = 'application/json'
+        if type(self).html is not None:
+            body, content_type = type(self).html, 'text/html'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_url():
+    StubUsersHandler.requests = []
+    StubUsersHandler.delay = 0.0
+    StubUsersHandler.html = None
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubUsersHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_resolver_caches_found_and_missing_users(api_url):
+    resolver = UserResolver(api_url=api_url)
+    assert resolver.resolve('id-1') == 'Ada Lovelace'
+    assert resolver.resolve('id-1') == 'Ada Lovelace'
+    assert resolver.resolve('unknown') is None
+    assert resolver.resolve('unknown') is None
+    assert StubUsersHandler.requests == ['id-1', 'unknown']
+
+
+def test_resolver_times_out(api_url):
+    StubUsersHandler.delay = 1.0
+    resolver = UserResolver(api_url=api_url, timeout=0.1)
+    start = time.monotonic()
+    with pytest.raises(UserLookupError):
+        resolver.resolve('id-1')
+    # the failure is cached, the slow API is not asked again
+    with pytest.raises(UserLookupError):
+        resolver.resolve('id-1')
+    assert time.monotonic() - start < 0.9
+    assert StubUsersHandler.requests == ['id-1']
+
+
+def test_read_user_falls_back_to_user_name(api_url, tmp_path):
+    path = tmp_path / 'user.h5'
+    with h5py.File(path, 'w') as f:
+        f['entry/user/name'] = b'camels_user'
+        f['entry/user/identifier/identifier'] = b'unknown'
+    resolver = UserResolver(api_url=api_url)
+    with h5py.File(path, 'r') as f:
+        assert read_user(f['entry'], logging.getLogger(), resolver) == 'camels_user'
+
+
+def test_non_json_reply_falls_back_to_user_name(api_url, tmp_path):
+    StubUsersHandler.html = b'<html><body>502 Bad Gateway</body></html>'
+    path = tmp_path / 'user.h5'
+    with h5py.File(path, 'w') as f:
+        f['entry/user/name'] = b'camels_user'
+        f['entry/user/identifier/identifier'] = b'id-1'
+    resolver = UserResolver(api_url=api_url)
+    with pytest.raises(UserLookupError):
+        resolver.resolve('id-1')
+    resolver.clear()
+    with h5py.File(path, 'r') as f:
+        assert read_user(f['entry'], logging.getLogger(), resolver) == 'camels_user'
+
+
+def test_in_process_resolver_uses_nomad_user_management(monkeypatch):
+    from nomad.datamodel import EntryArchive, User
+
+    def get(user_id=None, **kwargs):
+        if user_id == 'id-1':
+            return User(user_id=user_id, first_name='Ada', last_name='Lovelace')
+        return None
+
+    monkeypatch.setattr(User, 'get', staticmethod(get))
+    resolver = DatamodelUserResolver()
+    assert resolver.resolve('id-1') == 'Ada Lovelace'
+    assert resolver.resolve('unknown') is None
+    # standalone runs have no server context and use the HTTP resolver
+    assert not runs_in_nomad_worker(EntryArchive())
+    assert type(get_user_resolver(in_process=False)) is UserResolver
+    assert type(get_user_resolver(in_process=True)) is DatamodelUserResolver
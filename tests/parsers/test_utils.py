@@ -0,0 +1,190 @@
+import hashlib
+import io
+import json
+import logging
+import os
+
+import pytest
+from nomad.datamodel import EntryArchive
+
+from nomad_camels_plugin.parsers import utils
+from nomad_camels_plugin.parsers.parser import CamelsParser
+from nomad_camels_plugin.parsers.utils import (
+    archive_digest,
+    create_archive,
+    dict_nan_equal,
+    digest_filename,
+    write_archive,
+)
+
+CAMELS_FILE = 'tests/data/raw/test_CAMELS_file.nxs'
+
+
+class RawFileContext:
+    """
+    Minimal stand-in for the server context that keeps raw files in a directory.
+    """
+
+    upload_id = 'test_upload'
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.upload = self
+        self.processed = []
+
+    def raw_path_exists(self, filename):
+        return os.path.exists(os.path.join(self.directory, filename))
+
+    def raw_file(self, filename, mode):
+        return open(os.path.join(self.directory, filename), mode)
+
+    def process_updated_raw_file(self, filename, allow_modify=False):
+        self.processed.append(filename)
+
+
+@pytest.fixture(scope='module')
+def camels_archive():
+    data = CamelsParser().parse(
+        CAMELS_FILE, EntryArchive(), logging.getLogger(), testing=True
+    )
+    return EntryArchive(data=data)
+
+
+def test_streamed_archive_matches_dict_serialization(camels_archive):
+    streamed = io.StringIO()
+    write_archive(camels_archive, streamed, 'json')
+    assert streamed.getvalue() == json.dumps(camels_archive.m_to_dict())
+
+
+def test_create_archive(camels_archive, tmp_path):
+    context = RawFileContext(tmp_path)
+    logger = logging.getLogger()
+    filename = 'test_CAMELS_file.nxs.archive.json'
+    create_archive(camels_archive, context, filename, 'json', logger)
+    with open(tmp_path / filename) as f:
+        assert json.load(f) == json.loads(json.dumps(camels_archive.m_to_dict()))
+    with open(tmp_path / digest_filename(filename)) as f:
+        record = json.load(f)
+    assert record['sha256'] == archive_digest(camels_archive)
+    assert record['size'] == os.path.getsize(tmp_path / filename)
+    # unchanged content is processed again, without writing it
+    mtime = os.stat(tmp_path / filename).st_mtime_ns
+    create_archive(camels_archive, context, filename, 'json', logger)
+    assert context.processed == [filename, filename]
+    assert os.stat(tmp_path / filename).st_mtime_ns == mtime
+
+
+def test_create_archive_serializes_once(camels_archive, tmp_path, monkeypatch):
+    context = RawFileContext(tmp_path)
+    logger = logging.getLogger()
+    filename = 'test_CAMELS_file.nxs.archive.json'
+    encoded = []
+    encode_archive = utils._encode_archive
+
+    def count(entry, file_type):
+        encoded.append(file_type)
+        return encode_archive(entry, file_type)
+
+    monkeypatch.setattr(utils, '_encode_archive', count)
+    create_archive(camels_archive, context, filename, 'json', logger)
+    assert encoded == ['json']
+    create_archive(camels_archive, context, filename, 'json', logger)
+    assert encoded == ['json', 'json']
+
+
+def test_create_archive_detects_changes_by_digest(
+    camels_archive, tmp_path, monkeypatch
+):
+    context = RawFileContext(tmp_path)
+    logger = logging.getLogger()
+    filename = 'test_CAMELS_file.nxs.archive.json'
+    create_archive(camels_archive, context, filename, 'json', logger)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the existing archive must not be loaded')
+
+    monkeypatch.setattr(utils, 'dict_nan_equal', fail)
+    changed = {'data': {'name': 'changed'}}
+    create_archive(changed, context, filename, 'json', logger)
+    # different content is not written
+    assert context.processed == [filename]
+    create_archive(camels_archive, context, filename, 'json', logger)
+    assert context.processed == [filename, filename]
+
+
+def test_create_archive_without_stored_digest(camels_archive, tmp_path):
+    context = RawFileContext(tmp_path)
+    logger = logging.getLogger()
+    filename = 'test_CAMELS_file.nxs.archive.json'
+    with open(tmp_path / filename, 'w') as f:
+        json.dump(camels_archive.m_to_dict(), f)
+    create_archive(camels_archive, context, filename, 'json', logger)
+    assert context.processed == [filename]
+    assert os.path.exists(tmp_path / digest_filename(filename))
+
+
+def test_edited_archive_is_not_overwritten(camels_archive, tmp_path, caplog):
+    context = RawFileContext(tmp_path)
+    logger = logging.getLogger()
+    filename = 'test_CAMELS_file.nxs.archive.json'
+    create_archive(camels_archive, context, filename, 'json', logger)
+    # The archive is edited in the ELN, the stored digest is outdated
+    with open(tmp_path / filename) as f:
+        edited = json.load(f)
+    edited['data']['measurement_comments'] = 'Edited in NOMAD'
+    with open(tmp_path / filename, 'w') as f:
+        json.dump(edited, f)
+
+    with caplog.at_level(logging.ERROR):
+        create_archive(camels_archive, context, filename, 'json', logger)
+    assert 'different content' in caplog.text
+    assert context.processed == [filename]
+    with open(tmp_path / filename) as f:
+        assert json.load(f)['data']['measurement_comments'] == 'Edited in NOMAD'
+
+
+def test_archive_digest_is_the_digest_of_the_written_archive():
+    first = {'b': [float('nan'), 1.0], 'a': 'x'}
+    second = {'b': [-float('nan'), 1.0], 'a': 'x'}
+    written = io.StringIO()
+    assert write_archive(first, written, 'json') == archive_digest(first)
+    assert (
+        archive_digest(first)
+        == hashlib.sha256(written.getvalue().encode('utf-8')).hexdigest()
+    )
+    # All NaN values are encoded the same way, but the key order is kept
+    assert archive_digest(first) == archive_digest(second)
+    assert archive_digest(first) != archive_digest({'a': 'x', 'b': [float('nan'), 1.0]})
+
+
+def test_archive_digest_of_streamed_sections(camels_archive):
+    assert archive_digest(camels_archive) == archive_digest(camels_archive)
+    data = CamelsParser(max_trace_points=5).parse(
+        CAMELS_FILE, EntryArchive(), logging.getLogger(), testing=True
+    )
+    # Only the downsampled figure differs
+    assert archive_digest(EntryArchive(data=data)) != archive_digest(camels_archive)
+
+
+def test_dict_nan_equal():
+    nan = float('nan')
+    trace = {'x': list(range(1000)), 'y': [0.5] * 999 + [nan]}
+    assert dict_nan_equal({'data': [trace]}, {'data': [dict(trace)]})
+    changed = {'x': trace['x'], 'y': [0.5] * 998 + [0.25, nan]}
+    assert not dict_nan_equal({'data': [trace]}, {'data': [changed]})
+    assert not dict_nan_equal({'a': [1] * 20}, {'a': [1] * 21})
+    assert not dict_nan_equal({'a': 1}, {'b': 1})
+    assert not dict_nan_equal({'a': [1.0] * 20}, {'a': ['1.0'] * 20})
+    assert dict_nan_equal({'z': [[1, nan]] * 20}, {'z': [[1, nan]] * 20})
+
+
+def test_dict_nan_equal_deeply_nested():
+    first, second = {}, {}
+    inner_first, inner_second = first, second
+    for _ in range(10_000):
+        inner_first['child'] = {}
+        inner_second['child'] = {}
+        inner_first, inner_second = inner_first['child'], inner_second['child']
+    assert dict_nan_equal(first, second)
+    inner_second['value'] = 1
+    assert not dict_nan_equal(first, second)